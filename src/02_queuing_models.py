@@ -80,7 +80,7 @@ def __(mo):
 
         ```python
         def prob_of_more_than_n_on_queue(n: int, rho: float) -> float:
-            return 1.0 - prob_of_at_most_n_on_queue(n)
+            return 1.0 - prob_of_at_most_n_on_queue(n, rho)
         ```
         """
     )
@@ -89,47 +89,17 @@ def __(mo):
 
 @app.cell
 def __():
-    # 8/9
-
-    def rho(arrival_rate: int, departure_rate: int) -> float:
-        return arrival_rate / departure_rate
-
-
-    def prob_of_n_on_queue(n: int, rho: float) -> float:
-        return rho**n * (1 - rho)
-
-    def prob_of_at_most_n_on_queue(n: int, rho: float) -> float:
-        return sum(map(
-            lambda n: prob_of_n_on_queue(n, rho),
-            range(0, n+1)
-        ))
-
-    def prob_of_more_than_n_on_queue(n: int, rho: float) -> float:
-        return 1.0 - prob_of_at_most_n_on_queue(n)
-        
-    return (
-        prob_of_at_most_n_on_queue,
-        prob_of_more_than_n_on_queue,
-        prob_of_n_on_queue,
-        rho,
-    )
+    # Tables of p(n) and p(0..n), built once per (arrival, departure) pair
+    from queuing_models.cache import queue_table
+    return queue_table,
 
 
 @app.cell
-def __(mo, prob_of_n_on_queue, rho):
+def __(mo):
     get_arrival, set_arrival = mo.state(1)
-    get_departure, set_departure = mo.state(1)
+    get_departure, set_departure = mo.state(2)
     get_n, set_n = mo.state(1)
 
-    get_rho, set_rho = mo.state(
-        rho(arrival_rate=get_arrival(), departure_rate=get_departure())
-    )
-
-    p_of_n = prob_of_n_on_queue(
-        n=get_arrival(),
-        rho=float(get_rho())
-    )
-
     arrival_slider = mo.ui.number(
         0, 12, 
         value=get_arrival(), 
@@ -154,13 +124,10 @@ def __(mo, prob_of_n_on_queue, rho):
         get_arrival,
         get_departure,
         get_n,
-        get_rho,
         n_slider,
-        p_of_n,
         set_arrival,
         set_departure,
         set_n,
-        set_rho,
     )
 
 
@@ -171,15 +138,9 @@ def __(arrival_slider, departure_slider, n_slider):
 
 
 @app.cell
-def __(
-    get_arrival,
-    get_departure,
-    get_n,
-    mo,
-    prob_of_at_most_n_on_queue,
-    prob_of_n_on_queue,
-    rho,
-):
+def __(get_arrival, get_departure, get_n, mo, queue_table):
+    table = queue_table(get_arrival(), get_departure())
+
     mo.md(
         f"""
         ## Results
@@ -192,14 +153,16 @@ def __(
         $n =$ {get_n()}
 
 
-        $\\rho =$ {rho(get_arrival(), get_departure())}
+        $\\rho =$ {table.rho}
+
+        $p_n$ {table.probability_of_n_on_queue(get_n())}
 
-        $p_n$ {prob_of_n_on_queue(get_n(), rho(get_arrival(), get_departure()))}
+        $p \: at \: most$ = {table.probability_of_at_most_n_on_queue(get_n())}
 
-        $p \: at \: least$ = {prob_of_at_most_n_on_queue(get_n(), rho(get_arrival(), get_departure()))}
+        $p \: more \: than$ = {table.probability_of_more_than_n_on_queue(get_n())}
         """
     )
-    return
+    return table,
 
 
 if __name__ == "__main__":
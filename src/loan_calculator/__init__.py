@@ -1,7 +1,22 @@
+import argparse
+import copy
+import sys
 from enum import Enum
-from typing import Any, Tuple, List
-import numpy as np
-import termplotlib as tpl
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from .models import Loan, LoanPayment
+from .tables import balances_table, check_page, formats, loans_table, paginate, payments_table, users_table
+
+# NumPy and everything built on it are imported when first needed, so the CLI
+# starts (and `--help` answers) without loading them
+if TYPE_CHECKING:
+    import numpy as np
+    from .ledger import PaymentLedger
+    from .engine import BalanceEngine
+    from .forecast import MonthlyForecaster
+    from .journal import Journal
+    from .projection import PortfolioProjection
+    from .scenario import Scenario
 
 next_payment_id = 0
 repl_output_padding = "    "
@@ -44,158 +59,266 @@ class Command(Enum):
     ListLoanBalances       = 7
     PredictMonthlyPayments = 8
 
-class Loan:
-    name: str 
-    amount: float
-    interest_rate: float
-    creator: str
-    month_created: int
-    is_fixed_interest: bool
-    is_finished: bool
-
-    def __init__(self, name: str, amount: float, interest_rate: float, creator: str, month_created: int, is_fixed_interest: bool):
-        self.name = name
-        self.amount = amount
-        self.interest_rate = interest_rate
-        self.creator = creator
-        self.month_created = month_created
-        self.is_fixed_interest = is_fixed_interest
-
-class LoanPayment:
-    id: int
-    loan_name: int
-    amount: float
-    creator: str
-    month_created: int
-
-    def __init__(self, id: int, amount: float, loan_name: int, user_id: str, month_created: int):
-        self.id = id
-        self.loan_name = loan_name
-        self.amount = amount
-        self.user_id = user_id
-        self.month_created = month_created
-
-def format_text(text: str, width: int) -> str:
-    text_len = len(text)
-    if text_len > width:
-        return text[:width-3] + "..."
-    elif text_len < width:
-        return text + (" " * (width - text_len))
-    else:
-        return text
-
 class Interpreter:
     month_counter: int
     users: List[str]
     loans: List[Loan]
-    loan_payments: [LoanPayment]
+    loan_payments: "PaymentLedger"
+    # Loan name -> total paid towards the loan this month, which new loans start with
+    paid_this_month: Dict[str, float]
+    balances: "BalanceEngine"
+    forecaster: "MonthlyForecaster"
+    # Records every mutation when the interpreter's state is persisted
+    journal: Optional["Journal"]
+    # Set by `instrumentation.Metrics.attach` while metrics are being recorded
+    metrics: Optional[Any]
+    # Format of the listings printed by `interpret_command` (see `tables`)
+    output_format: str
 
     def __init__(self):
-        self.month_counter  = 0
-        self.users          = []
-        self.loans          = []
-        self.loan_payments  = []
+        from .ledger import PaymentLedger
+        from .engine import BalanceEngine
+        from .forecast import MonthlyForecaster
+
+        self.month_counter        = 0
+        self.users                = []
+        self.loans                = []
+        self.loan_payments        = PaymentLedger()
+        self.paid_this_month      = {}
+        self.balances             = BalanceEngine()
+        self.forecaster           = MonthlyForecaster()
+        self.journal              = None
+        self.metrics              = None
+        self.output_format        = "table"
 
     def increment_month_counter(self):
+        if self.journal is not None:
+            self.journal.record_increment_month()
+
+        self.check_finished_loans()
+        self.balances.advance_month()
+        self.forecaster.advance_month()
+        self.paid_this_month = {}
         self.month_counter += 1
 
     def create_user(self, username: str):
+        if self.journal is not None:
+            self.journal.record_create_user(username)
+
         self.users.append(username)
 
     def create_loan(self, name: str, creator: str, amount: float, interest_rate: float, is_fixed_interest: bool):
+        if self.journal is not None:
+            self.journal.record_create_loan(name, creator, amount, interest_rate, is_fixed_interest)
+
         loan = Loan(
-            name,
-            creator,
-            amount,
-            interest_rate,
-            self.month_counter,
-            is_fixed_interest,
+            id=len(self.loans),
+            name=name,
+            amount=amount,
+            interest_rate=interest_rate,
+            creator=creator,
+            month_created=self.month_counter,
+            is_fixed_interest=is_fixed_interest,
         )
         self.loans.append(loan)
+
+        self.balances.add_loan(loan, self.amount_paid_this_month(name))
+        loan.is_finished = loan.id not in self.balances.active
     
     def make_loan_payment(self, loan_name: str, username: str, amount: float):
-        payment = LoanPayment(
-            id=len(self.loan_payments), 
-            amount=amount, 
+        if self.journal is not None:
+            self.journal.record_loan_payment(loan_name, username, amount)
+
+        self.loan_payments.append(
             loan_name=loan_name,
-            user_id=username,
-            month_created=self.month_counter
+            username=username,
+            amount=amount,
+            month=self.month_counter
+        )
+        self.forecaster.record_payment(
+            self.loan_payments.loan_names.ids[loan_name],
+            self.loan_payments.usernames.ids[username],
+            amount,
         )
-        self.loan_payments.append(payment)
-
-    def check_finished_loans(self):
-        for index, loan in enumerate(self.loans):
-            if loan.is_finished: continue
 
-            loan_balance = self.check_loan_balance(loan)
-            if loan_balance >= 0:
-                loan.is_finished = True 
+        self.paid_this_month[loan_name] = self.paid_this_month.get(loan_name, 0) + amount
 
-    def check_monthly_totals(self) -> [float]:
-        number_of_months: int = self.month_counter
-        monthly_totals: int = [0] * (number_of_months+1)
+        self.mark_finished(self.balances.record_payment(loan_name, amount))
 
-        print(f"{monthly_totals}")
-        
-        for payment in self.loan_payments:
-            print(f"{payment.month_created}")
-            monthly_totals[payment.month_created] += payment.amount
+    def check_finished_loans(self):
+        self.mark_finished(self.balances.finish_paid_loans())
 
-        print(f"{monthly_totals}")
+    def mark_finished(self, slots: List[int]):
+        # New loans rather than changing them, as forks share the old ones
+        for slot in slots:
+            loan = copy.copy(self.loans[slot])
+            loan.is_finished = True
+            self.loans[slot] = loan
 
-        return monthly_totals
+    def amount_paid_this_month(self, loan_name: str) -> float:
+        return self.paid_this_month.get(loan_name, 0)
 
+    def fork(self) -> "Scenario":
+        """
+        A what-if copy of the loan book that shares this one's state and only
+        stores its own changes (see `scenario`).
+        """
+        from .scenario import Scenario
+        return Scenario(self)
 
+    def check_monthly_totals(self) -> "np.ndarray":
+        return self.loan_payments.monthly_totals(self.month_counter + 1)
 
     def check_loan_balance(self, loan: Loan) -> float:
-        payments = list(filter(
-            lambda payment: payment.loan_name == loan.name,
-            self.loan_payments
-        ))
-
-        number_of_months: int = self.month_counter - loan.month_created
-        monthly_totals: int = [0] * number_of_months
-        
-        for payment in payments:
-            monthly_totals[payment.month_created] += payment.amount
-
-        if loan.is_fixed_interest:
-            # Checking fof fixed interest loans
-
-            monthly_interest = loan.amount * loan.interest_rate
-            total_interest = last_month * number_of_months
-
-            amount_to_be_paid = loan.amount + total_interest
-            amount_paid = sum(monthly_totals)
-            balance = amount_paid - amount_to_be_paid
-            if balance < 0:
-                # If the loan isn't yet complete return the amount left
-                return (False, balance)
-            else:
-                # If the loan is complete return the amount carried over
-                return (True, balance)
-        else:
-            growth_rate = 1 + (loan.interest_rate / 100)
-
-            total_amount_paid = sum(monthly_totals)
-            valid_amount_paid = 0
-            amount_to_be_paid = loan.amount * growth_rate
+        """
+        Returns a negative balance while the loan is outstanding, otherwise the
+        (non-negative) amount paid over what was owed.
+        """
+        return self.balances.balance(loan.id)
 
-            for month in range(number_of_months):
-                monthly_total = monthly_totals[month]
+    def recompute_loan_balance(self, loan: Loan) -> float:
+        """Replays `check_loan_balance` from the loan's monthly payment totals."""
+        from .engine import replay_loan_balance
 
-                valid_amount_paid += monthly_total
-                amount_to_be_paid -= monthly_total
+        monthly_totals = self.loan_payments.loan_monthly_totals([loan.name], first_month=loan.month_created)
+        return replay_loan_balance(loan, monthly_totals.get(loan.name, {}), self.month_counter)
 
-                if amount_to_be_paid <= 0:
-                    extra_paid = abs(amount_to_be_paid)
-                    valid_amount_paid -= extra_paid
-                    return (True, total_amount_paid - valid_amount_paid)
-            return total_amount_paid - amount_to_be_paid
-        
     def loan_is_finished(self, loan: Loan) -> bool:
         if self.check_loan_balance(loan) >= 0:
             return True
+
+    def predict_monthly_payments(self, months: int) -> "np.ndarray":
+        """The monthly totals so far, followed by a linear forecast of the next `months` months."""
+        import numpy as np
+
+        return np.concatenate((self.forecaster.history(), self.forecaster.forecast(months)))
+
+    def predict_loan_payments(self, months: int) -> "np.ndarray":
+        """forecast[i, t]: payments towards the i-th loan t + 1 months from now."""
+        loan_ids = self.loan_payments.loan_names.ids
+        return self.forecaster.forecast_loans(months, [loan_ids.get(loan.name, -1) for loan in self.iter_loans()])
+
+    def predict_user_payments(self, months: int) -> "np.ndarray":
+        """forecast[i, t]: payments by the i-th user t + 1 months from now."""
+        user_ids = self.loan_payments.usernames.ids
+        return self.forecaster.forecast_users(months, [user_ids.get(username, -1) for username in self.iter_users()])
+
+    def loan_balances(self) -> "np.ndarray":
+        """Every loan's balance, in the order the loans were created."""
+        return self.balances.balances[:self.balances.size].copy()
+
+    def loan_growth_terms(self) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Every loan's (growth rate, monthly interest); see `BalanceEngine`."""
+        size = self.balances.size
+        return (self.balances.growth_rates[:size].copy(), self.balances.monthly_interest[:size].copy())
+
+    def average_monthly_payments(self) -> "np.ndarray":
+        """How much has been paid towards each loan per month since it was created."""
+        import numpy as np
+
+        loan_totals = self.loan_payments.loan_totals()
+        loan_ids = self.loan_payments.loan_names.ids
+        return np.array([
+            (loan_totals[loan_ids[loan.name]] if loan.name in loan_ids else 0)
+                / (self.month_counter - loan.month_created + 1)
+            for loan in self.iter_loans()
+        ])
+
+    def project_loan_balances(
+        self,
+        months: int,
+        scheduled_payments: Optional["np.ndarray"] = None,
+        keep_balances: bool = False,
+    ) -> "PortfolioProjection":
+        """
+        Projects every loan's balance `months` months ahead, assuming each loan
+        keeps receiving its `average_monthly_payments` unless a schedule is given.
+        Every month's balances are only kept if `keep_balances` is set.
+        """
+        import numpy as np
+        from .projection import project_balances
+
+        if scheduled_payments is None:
+            scheduled_payments = self.average_monthly_payments()
+
+        loans = list(self.iter_loans())
+        return project_balances(
+            balances=self.loan_balances(),
+            principals=np.array([loan.amount for loan in loans]),
+            interest_rates=np.array([loan.interest_rate for loan in loans]),
+            is_fixed_interest=np.array([loan.is_fixed_interest for loan in loans], dtype=bool),
+            scheduled_payments=scheduled_payments,
+            months=months,
+            keep_balances=keep_balances,
+        )
+
+    def count_users(self) -> int:
+        return len(self.users)
+
+    def count_loans(self) -> int:
+        return len(self.loans)
+
+    def count_loan_payments(self) -> int:
+        return len(self.loan_payments)
+
+    def iter_users(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[str]:
+        """The `limit` users after the first `offset`."""
+        return iter(paginate(self.users, limit, offset))
+
+    def iter_loans(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[Loan]:
+        """The `limit` loans after the first `offset`."""
+        return iter(paginate(self.loans, limit, offset))
+
+    def iter_loan_payments(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[LoanPayment]:
+        """The `limit` payments after the first `offset`, building only those."""
+        check_page(limit, offset)
+        return self.loan_payments.page(limit, offset)
+
+    def list_users(self, file=None, format: str = "table", limit: Optional[int] = None, offset: int = 0) -> int:
+        return users_table.render(
+            self.iter_users(limit, offset), file, format,
+            row=lambda i, username: (offset + i, username),
+            padding=repl_output_padding,
+        )
+
+    def list_loans(self, file=None, format: str = "table", limit: Optional[int] = None, offset: int = 0) -> int:
+        return loans_table.render(
+            self.iter_loans(limit, offset), file, format,
+            row=lambda i, loan: (offset + i, loan.name),
+            padding=repl_output_padding,
+        )
+
+    def list_loan_payments(self, file=None, format: str = "table", limit: Optional[int] = None, offset: int = 0) -> int:
+        return payments_table.render(
+            self.iter_loan_payments(limit, offset), file, format,
+            row=lambda i, payment: (payment.id, payment.loan_name, payment.amount),
+            padding=repl_output_padding,
+        )
+
+    def iter_loan_balances(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[Tuple[Loan, float]]:
+        """(loan, balance) for the `limit` loans after the first `offset`."""
+        return ((loan, self.check_loan_balance(loan)) for loan in paginate(self.iter_loans(), limit, offset))
+
+    def list_loan_balances(self, file=None, format: str = "table", limit: Optional[int] = None, offset: int = 0) -> int:
+        return balances_table.render(
+            self.iter_loan_balances(limit, offset), file, format,
+            row=lambda i, loan_balance: (offset + i, loan_balance[0].name, loan_balance[1]),
+            padding=repl_output_padding,
+        )
+
+    def checkpoint(self):
+        """Makes the changes so far durable. Called between commands."""
+        if self.journal is not None:
+            self.journal.flush()
+            self.journal.maybe_snapshot()
+        if self.metrics is not None:
+            self.metrics.maybe_export()
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+        if self.metrics is not None:
+            self.metrics.export()
         
     def interpret_command(self, command: Command):
         match command:
@@ -208,11 +331,7 @@ class Interpreter:
                 self.create_user(username)
 
             case Command.ListUsers:
-                print(f"{repl_output_padding}| S/N | Username |")
-
-                for (i, username) in enumerate(self.users):
-                    username = format_text(username, len("Username"))
-                    print(f"{repl_output_padding}| {i:03d} | {username} |")
+                self.list_users(format=self.output_format)
 
             case Command.CreateLoan:
                 loan_name         = input(f"{repl_output_padding}What is the name of the loan? ")
@@ -230,10 +349,7 @@ class Interpreter:
                 )
 
             case Command.ListLoans:
-                print(f"{repl_output_padding}| S/N | Loan Name            |")
-                for (i, loan) in enumerate(self.loans):
-                    loan_name = format_text(loan.name, len("Loan Name          "))
-                    print(f"{repl_output_padding}| {i:03d} | {loan_name} |")
+                self.list_loans(format=self.output_format)
 
             case Command.MakeLoanPayment:
                 loan_name         = input(f"{repl_output_padding}What is the name of the loan? ")
@@ -247,32 +363,16 @@ class Interpreter:
                 )
 
             case Command.ListLoanPayments:
-                print(f"{repl_output_padding}| S/N | Loan Name | Payment Amount |")
-                for payment in self.loan_payments:
-                    loan_name = format_text(payment.loan_name, len("Loan Name"))
-                    amount = payment.amount
-                    print(f"{repl_output_padding}| {payment.id:03d} | {loan_name} | {amount:014d}")
+                self.list_loan_payments(format=self.output_format)
 
             case Command.ListLoanBalances:
-                print(f"{repl_output_padding}| S/N | Loan Name | Loan Balance |")
-                for (i, loan) in enumerate(self.loans):
-                    loan_name = format_text(loan.name, len("Loan Name"))
-                    balance = self.check_loan_balance(loan)
-                    print(f"{repl_output_padding}| {i:03d} | {loan_name} | {balance:012d}")
+                self.list_loan_balances(format=self.output_format)
 
             case Command.PredictMonthlyPayments:
-                duration = int(input(f"{repl_output_padding}How many months do you wish to predict?"))
-                monthly_totals = self.check_monthly_totals()
-                number_of_months = len(monthly_totals)
-
-                # Simple linear regression
-                regression = np.polynomial.Polynomial.fit(
-                    [x for x in range(number_of_months)],
-                    monthly_totals,
-                    1
-                )
+                import termplotlib as tpl
 
-                monthly_totals += [regression(x) for x in range(number_of_months, number_of_months+duration)]
+                duration = int(input(f"{repl_output_padding}How many months do you wish to predict?"))
+                monthly_totals = self.predict_monthly_payments(duration)
 
                 figure = tpl.figure()
 
@@ -283,21 +383,94 @@ class Interpreter:
                 figure.show()
 
 
-def main():
-    interpreter = Interpreter()
+def row_count(text: str) -> int:
+    count = int(text)
+    if count < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {text!r}")
+    return count
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="loan-calculator", description="Riba, a tiny loan manager.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="replay the commands in FILE ('-' for stdin) instead of starting the REPL",
+    )
+    mode.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help="serve clients at ADDRESS ([HOST:]PORT or unix:PATH) instead of starting the REPL",
+    )
+    mode.add_argument(
+        "--list",
+        choices=("users", "loans", "payments", "balances"),
+        help="print a listing of the loan book instead of starting the REPL",
+    )
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument(
+        "--data-dir",
+        metavar="DIR",
+        help="persist the loan book in DIR, restoring it on startup",
+    )
+    storage.add_argument(
+        "--sqlite",
+        metavar="FILE",
+        help="keep the loan book in the SQLite database FILE instead of in memory",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="record per-command call counts, latencies and ledger sizes and export them to FILE",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=("json", "prometheus"),
+        default="json",
+        help="format of the --metrics file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        metavar="N",
+        type=int,
+        default=100_000,
+        help="snapshot the loan book every N logged changes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=formats,
+        default="table",
+        help="format of listings (default: %(default)s)",
+    )
+    parser.add_argument("--limit", metavar="N", type=row_count, help="list at most N rows")
+    parser.add_argument("--offset", metavar="N", type=row_count, default=0, help="skip the first N rows of a listing")
+    return parser.parse_args(argv)
+
+def replay_commands(interpreter: Interpreter, path: str) -> int:
+    from .batch import run_batch
+
+    try:
+        if path == "-":
+            report = run_batch(interpreter, sys.stdin)
+        else:
+            with open(path, buffering=1 << 20) as file:
+                report = run_batch(interpreter, file)
+    except (OSError, ValueError) as error:
+        print(f"riba: {error}", file=sys.stderr)
+        return 1
+
+    print(report, file=sys.stderr)
+    return 0
 
+def run_repl(interpreter: Interpreter) -> int:
     print(header)
     print(commands)
 
-    figure = tpl.figure()
-    figure.plot([1, 2, 3], [2, 4, 8])
-    figure.show()
-
     while True:
         user_input = input("riba> ").strip().lower()
         if user_input == 'q' or user_input == 'quit':
             print(exit_message)
-            return
+            return 0
 
         if user_input == '?' or user_input == 'help':
             print(commands)
@@ -307,5 +480,40 @@ def main():
         command = Command(command_code)
 
         interpreter.interpret_command(command)
-    return 0
+        interpreter.checkpoint()
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
 
+    if args.data_dir is not None:
+        from .journal import Journal
+        interpreter = Journal(args.data_dir, snapshot_interval=args.snapshot_interval).open()
+    elif args.sqlite is not None:
+        from .sqlite_store import SqliteInterpreter
+        interpreter = SqliteInterpreter(args.sqlite)
+    else:
+        interpreter = Interpreter()
+    interpreter.output_format = args.output_format
+
+    if args.metrics is not None:
+        from .instrumentation import Metrics
+        Metrics(args.metrics, args.metrics_format).attach(interpreter)
+
+    try:
+        if args.batch is not None:
+            return replay_commands(interpreter, args.batch)
+        if args.list is not None:
+            listing = {
+                "users": interpreter.list_users,
+                "loans": interpreter.list_loans,
+                "payments": interpreter.list_loan_payments,
+                "balances": interpreter.list_loan_balances,
+            }[args.list]
+            listing(format=args.output_format, limit=args.limit, offset=args.offset)
+            return 0
+        if args.serve is not None:
+            from .server import run_server
+            return run_server(interpreter, args.serve)
+        return run_repl(interpreter)
+    finally:
+        interpreter.close()
@@ -0,0 +1,120 @@
+"""
+Non-interactive replay of riba commands.
+
+Each line holds a command code followed by the same arguments the REPL would
+prompt for, separated by whitespace (or by tabs, when names contain spaces):
+
+    0                                       fast forward a month
+    1 <username>                            create a user
+    3 <loan> <creator> <amount> <rate> <yes|no>
+    5 <loan> <username> <amount>            make a loan payment
+
+Blank lines and lines starting with `#` are ignored. Listing and prediction
+commands only produce output, so they are counted and skipped.
+"""
+import time
+from typing import Callable, Iterable, List
+
+from . import Command, Interpreter
+
+read_only_codes = {
+    str(command.value) for command in (
+        Command.ListUsers,
+        Command.ListLoans,
+        Command.ListLoanPayments,
+        Command.ListLoanBalances,
+        Command.PredictMonthlyPayments,
+    )
+}
+
+
+class BatchReport:
+    commands: int
+    skipped: int
+    seconds: float
+
+    def __init__(self, commands: int, skipped: int, seconds: float):
+        self.commands = commands
+        self.skipped = skipped
+        self.seconds = seconds
+
+    def commands_per_second(self) -> float:
+        return self.commands / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"Replayed {self.commands:,} commands ({self.skipped:,} skipped) "
+            f"in {self.seconds:.3f}s ({self.commands_per_second():,.0f} commands/s)"
+        )
+
+
+def split_fields(line: str) -> List[str]:
+    """The fields of a command line; blank lines and comments have none."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#"):
+        return []
+    return line.rstrip("\r\n").split("\t") if "\t" in line else line.split()
+
+def mutation_applier(interpreter: Interpreter) -> Callable[[List[str]], None]:
+    """
+    A function that runs the mutating command in its `fields`, raising
+    ValueError if it isn't one. The interpreter's methods are looked up once,
+    as payments and month ends make up almost every command.
+    """
+    make_loan_payment       = interpreter.make_loan_payment
+    increment_month_counter = interpreter.increment_month_counter
+    create_user             = interpreter.create_user
+    create_loan             = interpreter.create_loan
+
+    def apply_mutation(fields: List[str]):
+        code = fields[0].strip()
+        if code == "5":
+            (_, loan_name, username, amount) = fields
+            make_loan_payment(loan_name, username, float(amount))
+        elif code == "0":
+            (_,) = fields
+            increment_month_counter()
+        elif code == "1":
+            (_, username) = fields
+            create_user(username)
+        elif code == "3":
+            (_, loan_name, creator, amount, interest_rate, is_fixed_interest) = fields
+            create_loan(
+                name=loan_name,
+                creator=creator,
+                amount=float(amount),
+                interest_rate=float(interest_rate),
+                is_fixed_interest=is_fixed_interest.lower().strip() == "yes"
+            )
+        else:
+            raise ValueError(f"unknown command {code!r}")
+
+    return apply_mutation
+
+
+def run_batch(interpreter: Interpreter, lines: Iterable[str]) -> BatchReport:
+    apply_mutation = mutation_applier(interpreter)
+
+    commands = 0
+    skipped = 0
+    start = time.perf_counter()
+
+    for (line_number, line) in enumerate(lines, 1):
+        fields = split_fields(line)
+        if not fields:
+            continue
+
+        try:
+            if fields[0].strip() in read_only_codes:
+                skipped += 1
+            else:
+                apply_mutation(fields)
+        except ValueError as error:
+            raise ValueError(f"line {line_number}: {error}") from error
+
+        commands += 1
+        if commands % 4096 == 0:
+            interpreter.checkpoint()
+
+    interpreter.checkpoint()
+    return BatchReport(commands, skipped, time.perf_counter() - start)
@@ -0,0 +1,216 @@
+"""
+Synthetic-workload benchmarks for the `Interpreter`.
+
+    python -m loan_calculator.benchmark --sizes 1e3 1e5 1e7 --output bench.json
+
+For every size a deterministic book of users, loans and payments is generated
+and each operation is timed. Peak memory is measured in a second, traced run
+so tracing does not skew the timings. Results are written as JSON.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import Interpreter
+from .journal import load_snapshot, save_snapshot
+
+number_of_months = 24
+
+
+class Workload:
+    users: List[str]
+    # (name, creator, amount, interest_rate, is_fixed_interest)
+    loans: List[tuple]
+    payment_loans: np.ndarray
+    payment_users: np.ndarray
+    payment_amounts: np.ndarray
+    # Index of the first payment of each month after the first
+    month_starts: np.ndarray
+
+    def __init__(self, users, loans, payment_loans, payment_users, payment_amounts, month_starts):
+        self.users = users
+        self.loans = loans
+        self.payment_loans = payment_loans
+        self.payment_users = payment_users
+        self.payment_amounts = payment_amounts
+        self.month_starts = month_starts
+
+    def __len__(self) -> int:
+        return len(self.payment_amounts)
+
+
+def generate_workload(payments: int, seed: int = 0) -> Workload:
+    rng = np.random.default_rng(seed)
+    number_of_users = max(10, payments // 1000)
+    number_of_loans = max(10, payments // 100)
+
+    users = [f"user{i}" for i in range(number_of_users)]
+    creators = rng.integers(number_of_users, size=number_of_loans)
+    amounts = rng.uniform(1_000, 10_000, size=number_of_loans).round(2)
+    interest_rates = rng.uniform(0, 2, size=number_of_loans).round(2)
+    is_fixed_interest = rng.random(number_of_loans) < 0.5
+    loans = [
+        (f"loan{i}", users[creators[i]], float(amounts[i]), float(interest_rates[i]), bool(is_fixed_interest[i]))
+        for i in range(number_of_loans)
+    ]
+
+    return Workload(
+        users=users,
+        loans=loans,
+        payment_loans=rng.integers(number_of_loans, size=payments),
+        payment_users=rng.integers(number_of_users, size=payments),
+        payment_amounts=rng.uniform(10, 500, size=payments).round(2),
+        month_starts=np.linspace(0, payments, number_of_months, endpoint=False, dtype=np.int64)[1:],
+    )
+
+def populate(interpreter: Interpreter, workload: Workload):
+    for username in workload.users:
+        interpreter.create_user(username)
+    for (name, creator, amount, interest_rate, is_fixed_interest) in workload.loans:
+        interpreter.create_loan(name, creator, amount, interest_rate, is_fixed_interest)
+
+def make_payments(interpreter: Interpreter, workload: Workload) -> int:
+    loan_names = [loan[0] for loan in workload.loans]
+    make_loan_payment = interpreter.make_loan_payment
+
+    start = 0
+    for end in [*workload.month_starts.tolist(), len(workload)]:
+        for (loan, user, amount) in zip(
+            workload.payment_loans[start:end].tolist(),
+            workload.payment_users[start:end].tolist(),
+            workload.payment_amounts[start:end].tolist(),
+        ):
+            make_loan_payment(loan_names[loan], workload.users[user], amount)
+        if end < len(workload):
+            interpreter.increment_month_counter()
+        start = end
+    return len(workload)
+
+def check_loan_balances(interpreter: Interpreter) -> int:
+    for loan in interpreter.loans:
+        interpreter.check_loan_balance(loan)
+    return len(interpreter.loans)
+
+def check_monthly_totals(interpreter: Interpreter) -> int:
+    interpreter.check_monthly_totals()
+    return 1
+
+def check_finished_loans(interpreter: Interpreter) -> int:
+    interpreter.check_finished_loans()
+    return 1
+
+def fit_monthly_payments(interpreter: Interpreter) -> int:
+    monthly_totals = interpreter.check_monthly_totals()
+    np.polynomial.Polynomial.fit(np.arange(len(monthly_totals)), monthly_totals, 1)
+    return 1
+
+def predict_monthly_payments(interpreter: Interpreter) -> int:
+    interpreter.predict_monthly_payments(12)
+    return 1
+
+def restore_snapshot(path: str) -> int:
+    load_snapshot(path)
+    return 1
+
+queries: Dict[str, Callable[[Interpreter], int]] = {
+    "check_loan_balance": check_loan_balances,
+    "check_monthly_totals": check_monthly_totals,
+    "check_finished_loans": check_finished_loans,
+    "predict_monthly_payments_fit": fit_monthly_payments,
+    "predict_monthly_payments": predict_monthly_payments,
+}
+
+
+def measure(operation: Callable[[], int], trace_memory: bool) -> Dict[str, float]:
+    if trace_memory:
+        tracemalloc.start()
+        operation()
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"peak_memory_bytes": peak}
+
+    start = time.perf_counter()
+    calls = operation()
+    seconds = time.perf_counter() - start
+    return {"calls": calls, "seconds": seconds, "seconds_per_call": seconds / calls}
+
+def benchmark_size(payments: int, seed: int, trace_memory: bool) -> List[Dict]:
+    workload = generate_workload(payments, seed)
+    results = []
+
+    def record(operation_name: str, run: Callable[[bool], Dict]):
+        result = run(False)
+        if trace_memory:
+            result.update(run(True))
+        results.append({
+            "payments": payments,
+            "loans": len(workload.loans),
+            "users": len(workload.users),
+            "operation": operation_name,
+            **result,
+        })
+
+    def run_payments(trace: bool) -> Dict:
+        interpreter = Interpreter()
+        populate(interpreter, workload)
+        return measure(lambda: make_payments(interpreter, workload), trace)
+
+    record("make_loan_payment", run_payments)
+
+    interpreter = Interpreter()
+    populate(interpreter, workload)
+    make_payments(interpreter, workload)
+
+    for (operation_name, query) in queries.items():
+        record(operation_name, lambda trace, query=query: measure(lambda: query(interpreter), trace))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "snapshot")
+        save_snapshot(interpreter, path)
+        record("load_snapshot", lambda trace: measure(lambda: restore_snapshot(path), trace))
+
+    return results
+
+def run_benchmarks(sizes: List[int], seed: int = 0, trace_memory: bool = True) -> Dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": seed,
+        "results": [
+            result
+            for payments in sizes
+            for result in benchmark_size(payments, seed, trace_memory)
+        ],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loan_calculator.benchmark", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e3, 1e4, 1e5], help="numbers of payments to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="FILE", help="write the JSON report to FILE instead of stdout")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced runs that measure peak memory")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks([int(size) for size in args.sizes], args.seed, not args.no_memory)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import copy
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+import numpy as np
+
+from .models import Loan
+
+initial_capacity = 256
+
+
+def loan_terms(amount: float, interest_rate: float, is_fixed_interest: bool) -> Tuple[float, float]:
+    """The (growth rate, monthly interest) a loan is charged at the end of every month."""
+    if is_fixed_interest:
+        return (1.0, amount * (interest_rate / 100))
+    return (1 + (interest_rate / 100), 0.0)
+
+
+class BalanceEngine:
+    """
+    Keeps every loan's balance up to date as payments and months come in.
+
+    Balances follow the same rules as `replay_loan_balance`:
+    they start at `-amount`, payments are added as they are made and, at the
+    end of every month, each loan that is still active is charged interest:
+
+        balance = balance * growth_rate - monthly_interest
+
+    Fixed interest loans have a growth rate of 1 and compounding loans have no
+    monthly interest. A loan is finished (and stops being charged interest)
+    as soon as its balance is no longer negative.
+
+    `fork` makes a copy that shares the arrays; whichever of the two changes
+    first copies them for itself.
+    """
+    size: int
+    balances: np.ndarray
+    growth_rates: np.ndarray
+    monthly_interest: np.ndarray
+    # Loan name -> slots of the loans with that name
+    slots_by_name: Dict[str, List[int]]
+    active: Set[int]
+    _active_slots: Optional[np.ndarray]
+    # Whether the arrays and containers may be shared with a fork
+    _shared: bool
+
+    def __init__(self, capacity: int = initial_capacity):
+        self.size             = 0
+        self.balances         = np.empty(capacity, dtype=np.float64)
+        self.growth_rates     = np.empty(capacity, dtype=np.float64)
+        self.monthly_interest = np.empty(capacity, dtype=np.float64)
+        self.slots_by_name    = {}
+        self.active           = set()
+        self._active_slots    = None
+        self._shared          = False
+
+    @classmethod
+    def from_loans(cls, loans: List[Loan], balances: np.ndarray) -> "BalanceEngine":
+        """Rebuilds an engine from `loans` and their previously saved balances."""
+        size = len(loans)
+        engine = cls(max(size, initial_capacity))
+        engine.size = size
+        for loan in loans:
+            engine.slots_by_name.setdefault(loan.name, []).append(loan.id)
+
+        # `loan_terms` for every loan at once
+        amounts = np.array([loan.amount for loan in loans], dtype=np.float64)
+        interest_rates = np.array([loan.interest_rate for loan in loans], dtype=np.float64)
+        is_fixed_interest = np.array([loan.is_fixed_interest for loan in loans], dtype=bool)
+        engine.growth_rates[:size] = np.where(is_fixed_interest, 1.0, 1 + (interest_rates / 100))
+        engine.monthly_interest[:size] = np.where(is_fixed_interest, amounts * (interest_rates / 100), 0.0)
+
+        engine.balances[:size] = balances
+        engine.active = {loan.id for loan in loans if not loan.is_finished}
+        engine._active_slots = None
+        return engine
+
+    def fork(self) -> "BalanceEngine":
+        engine = copy.copy(self)
+        self._shared = engine._shared = True
+        return engine
+
+    def _own(self):
+        for column in ("balances", "growth_rates", "monthly_interest"):
+            setattr(self, column, getattr(self, column)[:self.size].copy())
+        self.slots_by_name = dict(self.slots_by_name)
+        self.active = set(self.active)
+        self._shared = False
+
+    def _grow(self, capacity: int):
+        for column in ("balances", "growth_rates", "monthly_interest"):
+            old = getattr(self, column)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
+
+    def active_slots(self) -> np.ndarray:
+        if self._active_slots is None:
+            self._active_slots = np.fromiter(self.active, dtype=np.intp, count=len(self.active))
+        return self._active_slots
+
+    def add_loan(self, loan: Loan, amount_paid: float = 0) -> int:
+        """
+        Starts tracking `loan` and returns its slot. `amount_paid` is anything
+        already paid towards the loan's name this month.
+        """
+        if self._shared:
+            self._own()
+        slot = self.size
+        if slot == len(self.balances):
+            self._grow(max(2 * slot, initial_capacity))
+
+        self.set_terms(slot, loan)
+        self.balances[slot] = amount_paid - loan.amount
+        # A new list rather than an append, as the lists are shared with forks
+        self.slots_by_name[loan.name] = self.slots_by_name.get(loan.name, []) + [slot]
+        self.size += 1
+
+        if self.balances[slot] < 0:
+            self.active.add(slot)
+            self._active_slots = None
+        return slot
+
+    def set_terms(self, slot: int, loan: Loan):
+        """Charges the loan in `slot` interest on `loan`'s terms from now on."""
+        if self._shared:
+            self._own()
+        (self.growth_rates[slot], self.monthly_interest[slot]) = loan_terms(loan.amount, loan.interest_rate, loan.is_fixed_interest)
+
+    def set_balance(self, slot: int, balance: float) -> bool:
+        """Overwrites a loan's balance and returns whether the loan is finished."""
+        if self._shared:
+            self._own()
+        self.balances[slot] = balance
+        is_finished = balance >= 0
+        if is_finished != (slot not in self.active):
+            if is_finished:
+                self.active.discard(slot)
+            else:
+                self.active.add(slot)
+            self._active_slots = None
+        return is_finished
+
+    def record_payment(self, loan_name: str, amount: float) -> List[int]:
+        """Applies a payment and returns the slots of any loans it finished."""
+        if self._shared:
+            self._own()
+        finished = []
+        for slot in self.slots_by_name.get(loan_name, ()):
+            self.balances[slot] += amount
+            if slot in self.active and self.balances[slot] >= 0:
+                self.active.discard(slot)
+                self._active_slots = None
+                finished.append(slot)
+        return finished
+
+    def finish_paid_loans(self) -> List[int]:
+        """Deactivates and returns the slots of active loans that are paid off."""
+        if self._shared:
+            self._own()
+        slots = self.active_slots()
+        finished = slots[self.balances[slots] >= 0].tolist()
+        if finished:
+            self.active.difference_update(finished)
+            self._active_slots = None
+        return finished
+
+    def advance_month(self):
+        """Charges a month of interest to every active loan."""
+        if self._shared:
+            self._own()
+        slots = self.active_slots()
+        self.balances[slots] = self.balances[slots] * self.growth_rates[slots] - self.monthly_interest[slots]
+
+    def balance(self, slot: int) -> float:
+        return float(self.balances[slot])
+
+
+def replay_loan_balance(
+    loan: Loan,
+    monthly_totals: Mapping[int, float],
+    month_counter: int,
+    rate_changes: Optional[Mapping[int, Tuple[float, bool]]] = None,
+) -> float:
+    """
+    Computes `loan`'s balance from scratch, given the total paid towards it in
+    each month and the current month. `rate_changes` maps months to the
+    (interest_rate, is_fixed_interest) the loan is charged from the end of
+    that month on.
+    """
+    (growth_rate, monthly_interest) = loan_terms(loan.amount, loan.interest_rate, loan.is_fixed_interest)
+
+    balance = -loan.amount
+    for month in range(loan.month_created, month_counter + 1):
+        balance += monthly_totals.get(month, 0)
+
+        if balance >= 0:
+            # Anything paid after the loan was completed is carried over
+            carried_over = sum(
+                total for (payment_month, total) in monthly_totals.items()
+                if payment_month > month
+            )
+            return balance + carried_over
+
+        if month == month_counter:
+            break
+
+        # Interest is charged at the end of every month the loan is open
+        if rate_changes is not None and month in rate_changes:
+            (growth_rate, monthly_interest) = loan_terms(loan.amount, *rate_changes[month])
+        balance = balance * growth_rate - monthly_interest
+
+    return balance
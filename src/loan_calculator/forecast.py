@@ -0,0 +1,231 @@
+"""
+Incremental least-squares forecasts of monthly payments.
+
+A straight line y = a + b x fitted to the monthly totals y at months x only
+depends on the sums
+
+    S = Σ w,  Sx = Σ w x,  Sxx = Σ w x²,  Sy = Σ w y,  Sxy = Σ w x y
+
+    b = (S Sxy - Sx Sy) / (S Sxx - Sx²),   a = (Sy - b Sx) / S
+
+where month x has weight w = decay^(current month - x), so `decay=1` is
+ordinary least squares (the same line as `np.polynomial.Polynomial.fit`)
+and smaller decays favour recent months. A payment adds to Sy and Sxy, and a
+new month rescales every sum by the decay and adds the month to S, Sx and
+Sxx, so a forecast costs the same however long the ledger gets.
+
+The x sums are shared by every series. Sy and Sxy are kept for the whole
+book and, as arrays indexed by interned id, for every loan and every user,
+so all loans (or users) are forecast at once.
+
+`fork` makes a copy that shares the arrays until either of the two records
+a payment or a month.
+"""
+import copy
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .ledger import PaymentLedger
+
+initial_capacity = 64
+
+
+def fit_lines(weight_sum: float, x_sum: float, xx_sum: float, y_sums, xy_sums):
+    """The intercepts and slopes of the lines with the given sums."""
+    y_sums = np.asarray(y_sums, dtype=np.float64)
+    xy_sums = np.asarray(xy_sums, dtype=np.float64)
+    determinant = weight_sum * xx_sum - x_sum**2
+
+    # With a single month there is no trend, only the month's total
+    if determinant <= 1e-12 * weight_sum * xx_sum:
+        return (y_sums / weight_sum, np.zeros_like(y_sums))
+
+    slopes = (weight_sum * xy_sums - x_sum * y_sums) / determinant
+    intercepts = (y_sums - slopes * x_sum) / weight_sum
+    return (intercepts, slopes)
+
+
+class MonthlyForecaster:
+    decay: float
+    month: int
+    weight_sum: float
+    x_sum: float
+    xx_sum: float
+    y_sum: float
+    xy_sum: float
+    # Indexed by the interned loan and user ids of the payment ledger
+    loan_y_sums: np.ndarray
+    loan_xy_sums: np.ndarray
+    user_y_sums: np.ndarray
+    user_xy_sums: np.ndarray
+    # Total paid in each month so far, indexed by month
+    monthly_totals: np.ndarray
+    _shared: bool
+
+    def __init__(self, decay: float = 1.0, month: int = 0):
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be in (0, 1]")
+        self.decay = decay
+        self.month = 0
+        self.weight_sum = 1.0
+        self.x_sum = 0.0
+        self.xx_sum = 0.0
+        self.y_sum = 0.0
+        self.xy_sum = 0.0
+        self.loan_y_sums = np.zeros(initial_capacity)
+        self.loan_xy_sums = np.zeros(initial_capacity)
+        self.user_y_sums = np.zeros(initial_capacity)
+        self.user_xy_sums = np.zeros(initial_capacity)
+        self.monthly_totals = np.zeros(max(initial_capacity, month + 1))
+        self._shared = False
+
+        if decay == 1:
+            (self.month, self.weight_sum) = (month, month + 1.0)
+            self.x_sum = month * (month + 1) / 2
+            self.xx_sum = month * (month + 1) * (2 * month + 1) / 6
+        else:
+            for _ in range(month):
+                self._advance_x_sums()
+
+    @classmethod
+    def from_ledger(cls, ledger: "PaymentLedger", month_counter: int, decay: float = 1.0) -> "MonthlyForecaster":
+        forecaster = cls(decay, month_counter)
+        size = len(ledger)
+        forecaster.add_payments(
+            ledger.months[:size],
+            ledger.amounts[:size],
+            ledger.loan_ids[:size],
+            ledger.user_ids[:size],
+        )
+        return forecaster
+
+    def fork(self) -> "MonthlyForecaster":
+        forecaster = copy.copy(self)
+        self._shared = forecaster._shared = True
+        return forecaster
+
+    def _own(self):
+        for sums in ("loan_y_sums", "loan_xy_sums", "user_y_sums", "user_xy_sums", "monthly_totals"):
+            setattr(self, sums, getattr(self, sums).copy())
+        self._shared = False
+
+    @staticmethod
+    def _fit(sums: np.ndarray, size: int) -> np.ndarray:
+        if size <= len(sums):
+            return sums
+        grown = np.zeros(max(2 * len(sums), size))
+        grown[:len(sums)] = sums
+        return grown
+
+    def add_payments(self, months, amounts, loan_ids=None, user_ids=None, include_in_total: bool = True):
+        """
+        Adds many past payments at once. Payments can be added to the loan
+        and user sums in separate calls, as long as only one of them also
+        counts them towards the book's total.
+        """
+        months = np.asarray(months, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if len(months) == 0:
+            return
+        if self._shared:
+            self._own()
+
+        weighted = amounts * self.decay**(self.month - months)
+        x_weighted = weighted * months
+
+        if include_in_total:
+            self.y_sum += float(weighted.sum())
+            self.xy_sum += float(x_weighted.sum())
+            self.monthly_totals = self._fit(self.monthly_totals, int(months.max()) + 1)
+            self.monthly_totals += np.bincount(months, weights=amounts, minlength=len(self.monthly_totals))
+
+        for (ids, prefix) in ((loan_ids, "loan"), (user_ids, "user")):
+            if ids is None:
+                continue
+            ids = np.asarray(ids, dtype=np.int64)
+            size = int(ids.max()) + 1
+            y_sums = self._fit(getattr(self, f"{prefix}_y_sums"), size)
+            xy_sums = self._fit(getattr(self, f"{prefix}_xy_sums"), size)
+            y_sums += np.bincount(ids, weights=weighted, minlength=len(y_sums))
+            xy_sums += np.bincount(ids, weights=x_weighted, minlength=len(xy_sums))
+            setattr(self, f"{prefix}_y_sums", y_sums)
+            setattr(self, f"{prefix}_xy_sums", xy_sums)
+
+    def record_payment(self, loan_id: int, user_id: int, amount: float):
+        """A payment made in the current month."""
+        if self._shared:
+            self._own()
+        x_amount = self.month * amount
+        self.y_sum += amount
+        self.xy_sum += x_amount
+        self.monthly_totals[self.month] += amount
+
+        if loan_id >= len(self.loan_y_sums):
+            self.loan_y_sums = self._fit(self.loan_y_sums, loan_id + 1)
+            self.loan_xy_sums = self._fit(self.loan_xy_sums, loan_id + 1)
+        self.loan_y_sums[loan_id] += amount
+        self.loan_xy_sums[loan_id] += x_amount
+
+        if user_id >= len(self.user_y_sums):
+            self.user_y_sums = self._fit(self.user_y_sums, user_id + 1)
+            self.user_xy_sums = self._fit(self.user_xy_sums, user_id + 1)
+        self.user_y_sums[user_id] += amount
+        self.user_xy_sums[user_id] += x_amount
+
+    def _advance_x_sums(self):
+        decay = self.decay
+        self.month += 1
+        self.weight_sum = decay * self.weight_sum + 1
+        self.x_sum = decay * self.x_sum + self.month
+        self.xx_sum = decay * self.xx_sum + self.month**2
+
+    def advance_month(self):
+        if self._shared:
+            self._own()
+        self._advance_x_sums()
+        if self.decay != 1:
+            self.y_sum *= self.decay
+            self.xy_sum *= self.decay
+            for sums in (self.loan_y_sums, self.loan_xy_sums, self.user_y_sums, self.user_xy_sums):
+                sums *= self.decay
+        if self.month == len(self.monthly_totals):
+            self.monthly_totals = self._fit(self.monthly_totals, self.month + 1)
+
+    def _forecast(self, y_sums, xy_sums, months: int) -> np.ndarray:
+        (intercepts, slopes) = fit_lines(self.weight_sum, self.x_sum, self.xx_sum, y_sums, xy_sums)
+        future = np.arange(self.month + 1, self.month + 1 + months)
+        return intercepts[..., None] + slopes[..., None] * future
+
+    def history(self) -> np.ndarray:
+        """The total paid in each month up to and including the current one."""
+        return self.monthly_totals[:self.month + 1]
+
+    def forecast(self, months: int) -> np.ndarray:
+        """The book's total payments in each of the next `months` months."""
+        return self._forecast(self.y_sum, self.xy_sum, months)
+
+    def _forecast_entities(self, prefix: str, ids, months: int) -> np.ndarray:
+        y_sums = getattr(self, f"{prefix}_y_sums")
+        xy_sums = getattr(self, f"{prefix}_xy_sums")
+        if ids is None:
+            return self._forecast(y_sums, xy_sums, months)
+
+        # Ids that have never paid (or -1, for names that were never interned) forecast zero
+        ids = np.asarray(ids, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(y_sums))
+        safe_ids = np.where(known, ids, 0)
+        return self._forecast(
+            np.where(known, y_sums[safe_ids], 0),
+            np.where(known, xy_sums[safe_ids], 0),
+            months,
+        )
+
+    def forecast_loans(self, months: int, loan_ids=None) -> np.ndarray:
+        """forecast[i, t]: payments towards loan `loan_ids[i]` (by default every interned id) t + 1 months ahead."""
+        return self._forecast_entities("loan", loan_ids, months)
+
+    def forecast_users(self, months: int, user_ids=None) -> np.ndarray:
+        """forecast[i, t]: payments by user `user_ids[i]` (by default every interned id) t + 1 months ahead."""
+        return self._forecast_entities("user", user_ids, months)
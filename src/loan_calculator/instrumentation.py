@@ -0,0 +1,212 @@
+"""
+Call counts, latency histograms and ledger sizes for riba commands.
+
+`Metrics.attach` wraps the methods an interpreter's `interpret_command`
+dispatches to on that one instance, so an interpreter without metrics attached
+runs exactly the same code as before. Only those methods are timed: the time
+`interpret_command` spends waiting on its prompts is the operator's, not the
+command's. Metrics are exported either as JSON or in the Prometheus
+text format, written atomically so a scraper never sees a partial file.
+"""
+import json
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import Command, Interpreter
+
+# Upper bounds, in seconds, of the latency histogram buckets
+latency_buckets = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+instrumented_operations = {
+    "increment_month_counter":  Command.IncrementMonth,
+    "create_user":              Command.CreateUser,
+    "create_loan":              Command.CreateLoan,
+    "make_loan_payment":        Command.MakeLoanPayment,
+    "list_users":               Command.ListUsers,
+    "list_loans":               Command.ListLoans,
+    "list_loan_payments":       Command.ListLoanPayments,
+    "list_loan_balances":       Command.ListLoanBalances,
+    "predict_monthly_payments": Command.PredictMonthlyPayments,
+}
+
+
+class Histogram:
+    # bucket_counts[i] counts observations in (latency_buckets[i-1], latency_buckets[i]],
+    # with a final bucket for everything slower
+    bucket_counts: List[int]
+    count: int
+    sum: float
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(latency_buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(latency_buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative_counts(self) -> List[int]:
+        counts = []
+        total = 0
+        for count in self.bucket_counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class Metrics:
+    # (kind, command) -> latencies, where kind is "command" for calls made by
+    # interpret_command and "operation" for direct ones
+    latencies: Dict[Tuple[str, Command], Histogram]
+    # command -> number of payments, loans and users after it last ran
+    ledger_sizes: Dict[Command, Tuple[int, int, int]]
+    path: Optional[str]
+    format: str
+    export_interval: float
+    last_export: float
+
+    def __init__(self, path: Optional[str] = None, format: str = "json", export_interval: float = 10.0):
+        if format not in ("json", "prometheus"):
+            raise ValueError(f"unknown metrics format {format!r}")
+
+        self.latencies = {}
+        self.ledger_sizes = {}
+        self.path = path
+        self.format = format
+        self.export_interval = export_interval
+        self.last_export = time.monotonic()
+        self._interpreter = None
+        self._kind = "operation"
+
+    def observe(self, kind: str, command: Command, seconds: float):
+        histogram = self.latencies.get((kind, command))
+        if histogram is None:
+            histogram = self.latencies[(kind, command)] = Histogram()
+        histogram.observe(seconds)
+
+        interpreter = self._interpreter
+        self.ledger_sizes[command] = (
+            interpreter.count_loan_payments(),
+            interpreter.count_loans(),
+            interpreter.count_users(),
+        )
+
+    def _wrap_command(self, interpret_command: Callable) -> Callable:
+        """Records the operations `interpret_command` runs as commands, without timing its prompts."""
+        def instrumented_command(command: Command):
+            self._kind = "command"
+            try:
+                return interpret_command(command)
+            finally:
+                self._kind = "operation"
+        return instrumented_command
+
+    def _wrap(self, method: Callable, command: Command) -> Callable:
+        observe = self.observe
+        perf_counter = time.perf_counter
+
+        def instrumented_operation(*args, **kwargs):
+            kind = self._kind
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                observe(kind, command, perf_counter() - start)
+        return instrumented_operation
+
+    def attach(self, interpreter: "Interpreter") -> "Metrics":
+        """Starts recording metrics for `interpreter`."""
+        self._interpreter = interpreter
+        interpreter.metrics = self
+        interpreter.interpret_command = self._wrap_command(interpreter.interpret_command)
+        for (name, command) in instrumented_operations.items():
+            setattr(interpreter, name, self._wrap(getattr(interpreter, name), command))
+        return self
+
+    def detach(self):
+        """Stops recording, leaving the interpreter as it was before `attach`."""
+        interpreter = self._interpreter
+        if interpreter is None:
+            return
+        for name in ("interpret_command", *instrumented_operations):
+            interpreter.__dict__.pop(name, None)
+        interpreter.metrics = None
+        self._interpreter = None
+
+    def to_json(self) -> Dict:
+        return {
+            "latency_buckets": list(latency_buckets),
+            "latencies": [
+                {
+                    "kind": kind,
+                    "command": command.name,
+                    "calls": histogram.count,
+                    "total_seconds": histogram.sum,
+                    "bucket_counts": histogram.bucket_counts,
+                }
+                for ((kind, command), histogram) in sorted(self.latencies.items(), key=lambda item: (item[0][0], item[0][1].value))
+            ],
+            "ledger_sizes": {
+                command.name: {"payments": payments, "loans": loans, "users": users}
+                for (command, (payments, loans, users)) in sorted(self.ledger_sizes.items(), key=lambda item: item[0].value)
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP riba_calls_total Number of riba commands and operations run.",
+            "# TYPE riba_calls_total counter",
+        ]
+        latencies = sorted(self.latencies.items(), key=lambda item: (item[0][0], item[0][1].value))
+        for ((kind, command), histogram) in latencies:
+            lines.append(f'riba_calls_total{{kind="{kind}",command="{command.name}"}} {histogram.count}')
+
+        lines += [
+            "# HELP riba_latency_seconds How long riba commands and operations take.",
+            "# TYPE riba_latency_seconds histogram",
+        ]
+        for ((kind, command), histogram) in latencies:
+            labels = f'kind="{kind}",command="{command.name}"'
+            bounds = [repr(float(bound)) for bound in latency_buckets] + ["+Inf"]
+            for (bound, count) in zip(bounds, histogram.cumulative_counts()):
+                lines.append(f'riba_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"riba_latency_seconds_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"riba_latency_seconds_count{{{labels}}} {histogram.count}")
+
+        for (index, size) in enumerate(("payments", "loans", "users")):
+            lines += [
+                f"# HELP riba_ledger_{size} Number of {size} after each command last ran.",
+                f"# TYPE riba_ledger_{size} gauge",
+            ]
+            for (command, sizes) in sorted(self.ledger_sizes.items(), key=lambda item: item[0].value):
+                lines.append(f'riba_ledger_{size}{{command="{command.name}"}} {sizes[index]}')
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Optional[str] = None):
+        path = path or self.path
+        if path is None:
+            return
+
+        if self.format == "json":
+            contents = json.dumps(self.to_json(), indent=2) + "\n"
+        else:
+            contents = self.to_prometheus()
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(contents)
+        os.replace(temporary_path, path)
+        self.last_export = time.monotonic()
+
+    def maybe_export(self):
+        """Exports if more than `export_interval` seconds have passed since the last export."""
+        if time.monotonic() - self.last_export >= self.export_interval:
+            self.export()
@@ -0,0 +1,323 @@
+"""
+Durable storage for `Interpreter` state.
+
+A data directory holds numbered generations. Generation `n` consists of an
+optional snapshot directory `snapshot-n/` (the complete state when the
+generation started) and an append-only log `wal-n.log` of every mutation made
+since. On startup the newest snapshot is memory mapped and only its log is
+replayed. Taking a snapshot starts a new generation and removes older ones.
+
+Log records are laid out as
+
+    op: u8 | payload length: u32 | payload | crc32(op + payload): u32
+
+where `op` is the value of the `Command` that made the change. A torn or
+corrupt record at the end of the log (e.g. after a crash) is discarded.
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import zlib
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+
+from .models import Loan
+from .ledger import PaymentLedger, StringInterner
+from .engine import BalanceEngine
+from .forecast import MonthlyForecaster
+
+if TYPE_CHECKING:
+    from . import Interpreter
+
+OP_INCREMENT_MONTH    = 0
+OP_CREATE_USER        = 1
+OP_CREATE_LOAN        = 3
+OP_MAKE_LOAN_PAYMENT  = 5
+
+record_header  = struct.Struct("<BI")
+record_trailer = struct.Struct("<I")
+string_length  = struct.Struct("<I")
+loan_terms     = struct.Struct("<dd?")
+payment_amount = struct.Struct("<d")
+
+ledger_columns = ("amounts", "months", "loan_ids", "user_ids")
+forecaster_sums = ("decay", "month", "weight_sum", "x_sum", "xx_sum", "y_sum", "xy_sum")
+forecaster_arrays = ("loan_y_sums", "loan_xy_sums", "user_y_sums", "user_xy_sums", "monthly_totals")
+
+
+def encode_string(string: str) -> bytes:
+    data = string.encode("utf-8")
+    return string_length.pack(len(data)) + data
+
+def decode_string(buffer, offset: int) -> Tuple[str, int]:
+    (length,) = string_length.unpack_from(buffer, offset)
+    offset += string_length.size
+    return (buffer[offset:offset+length].decode("utf-8"), offset + length)
+
+
+class Journal:
+    directory: str
+    snapshot_interval: int
+    fsync: bool
+    generation: int
+    records_since_snapshot: int
+    interpreter: Optional["Interpreter"]
+
+    def __init__(self, directory: str, snapshot_interval: int = 100_000, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.generation = 0
+        self.records_since_snapshot = 0
+        self.interpreter = None
+        self._log = None
+
+    def snapshot_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"snapshot-{generation:08d}")
+
+    def log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"wal-{generation:08d}.log")
+
+    def open(self) -> "Interpreter":
+        """Restores the saved interpreter and starts logging its mutations."""
+        from . import Interpreter
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.generation = self.latest_snapshot_generation()
+
+        if self.generation > 0:
+            interpreter = load_snapshot(self.snapshot_path(self.generation))
+        else:
+            interpreter = Interpreter()
+
+        log_path = self.log_path(self.generation)
+        (self.records_since_snapshot, valid_length) = replay_log(interpreter, log_path)
+
+        self._log = open(log_path, "ab", buffering=1 << 20)
+        if self._log.tell() > valid_length:
+            self._log.truncate(valid_length)
+            self._log.seek(valid_length)
+
+        interpreter.journal = self
+        self.interpreter = interpreter
+        return interpreter
+
+    def latest_snapshot_generation(self) -> int:
+        generations = [
+            int(entry[len("snapshot-"):])
+            for entry in os.listdir(self.directory)
+            if entry.startswith("snapshot-") and entry[len("snapshot-"):].isdigit()
+        ]
+        return max(generations, default=0)
+
+    def _append(self, op: int, payload: bytes):
+        header = record_header.pack(op, len(payload))
+        checksum = zlib.crc32(payload, zlib.crc32(header[:1]))
+        self._log.write(header + payload + record_trailer.pack(checksum))
+        self.records_since_snapshot += 1
+
+    def record_increment_month(self):
+        self._append(OP_INCREMENT_MONTH, b"")
+
+    def record_create_user(self, username: str):
+        self._append(OP_CREATE_USER, encode_string(username))
+
+    def record_create_loan(self, name: str, creator: str, amount: float, interest_rate: float, is_fixed_interest: bool):
+        self._append(
+            OP_CREATE_LOAN,
+            encode_string(name) + encode_string(creator) + loan_terms.pack(amount, interest_rate, is_fixed_interest)
+        )
+
+    def record_loan_payment(self, loan_name: str, username: str, amount: float):
+        self._append(
+            OP_MAKE_LOAN_PAYMENT,
+            encode_string(loan_name) + encode_string(username) + payment_amount.pack(amount)
+        )
+
+    def flush(self):
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def maybe_snapshot(self):
+        if self.records_since_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self):
+        """Writes a snapshot of the interpreter and starts a new log."""
+        generation = self.generation + 1
+        path = self.snapshot_path(generation)
+
+        self.flush()
+        save_snapshot(self.interpreter, path)
+
+        self._log.close()
+        self._log = open(self.log_path(generation), "ab", buffering=1 << 20)
+        self.flush()
+
+        previous_generation = self.generation
+        self.generation = generation
+        self.records_since_snapshot = 0
+
+        for old_generation in range(previous_generation, -1, -1):
+            old_log = self.log_path(old_generation)
+            old_snapshot = self.snapshot_path(old_generation)
+            if not (os.path.exists(old_log) or os.path.exists(old_snapshot)):
+                break
+            if os.path.exists(old_log):
+                os.remove(old_log)
+            shutil.rmtree(old_snapshot, ignore_errors=True)
+
+    def close(self):
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._log = None
+        if self.interpreter is not None:
+            self.interpreter.journal = None
+            self.interpreter = None
+
+
+def replay_log(interpreter: "Interpreter", path: str) -> Tuple[int, int]:
+    """
+    Applies every intact record in the log at `path` to `interpreter`.
+    Returns the number of records replayed and the length of the intact prefix.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return (0, 0)
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offset = 0
+        records = 0
+
+        while offset + record_header.size <= len(buffer):
+            (op, length) = record_header.unpack_from(buffer, offset)
+            payload_start = offset + record_header.size
+            payload_end = payload_start + length
+            if payload_end + record_trailer.size > len(buffer):
+                break
+
+            payload = buffer[payload_start:payload_end]
+            (checksum,) = record_trailer.unpack_from(buffer, payload_end)
+            if checksum != zlib.crc32(payload, zlib.crc32(buffer[offset:offset+1])):
+                break
+
+            apply_record(interpreter, op, payload)
+            records += 1
+            offset = payload_end + record_trailer.size
+
+    return (records, offset)
+
+def apply_record(interpreter: "Interpreter", op: int, payload):
+    if op == OP_MAKE_LOAN_PAYMENT:
+        (loan_name, offset) = decode_string(payload, 0)
+        (username, offset) = decode_string(payload, offset)
+        (amount,) = payment_amount.unpack_from(payload, offset)
+        interpreter.make_loan_payment(loan_name, username, amount)
+
+    elif op == OP_INCREMENT_MONTH:
+        interpreter.increment_month_counter()
+
+    elif op == OP_CREATE_USER:
+        (username, _) = decode_string(payload, 0)
+        interpreter.create_user(username)
+
+    elif op == OP_CREATE_LOAN:
+        (name, offset) = decode_string(payload, 0)
+        (creator, offset) = decode_string(payload, offset)
+        (amount, interest_rate, is_fixed_interest) = loan_terms.unpack_from(payload, offset)
+        interpreter.create_loan(
+            name=name,
+            creator=creator,
+            amount=amount,
+            interest_rate=interest_rate,
+            is_fixed_interest=is_fixed_interest
+        )
+
+    else:
+        raise ValueError(f"unknown journal record {op}")
+
+
+def save_snapshot(interpreter: "Interpreter", path: str):
+    temporary_path = path + ".tmp"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+
+    ledger = interpreter.loan_payments
+    for column in ledger_columns:
+        np.save(os.path.join(temporary_path, f"{column}.npy"), getattr(ledger, column)[:ledger.size])
+    np.save(os.path.join(temporary_path, "balances.npy"), interpreter.balances.balances[:interpreter.balances.size])
+    forecaster = interpreter.forecaster
+    for array in forecaster_arrays:
+        np.save(os.path.join(temporary_path, f"{array}.npy"), getattr(forecaster, array))
+
+    meta = {
+        "month_counter": interpreter.month_counter,
+        "users": interpreter.users,
+        "loans": [
+            [loan.name, loan.amount, loan.interest_rate, loan.creator, loan.month_created, loan.is_fixed_interest, loan.is_finished]
+            for loan in interpreter.loans
+        ],
+        "loan_names": ledger.loan_names.strings,
+        "usernames": ledger.usernames.strings,
+        "forecaster": {name: getattr(forecaster, name) for name in forecaster_sums},
+        "paid_this_month": interpreter.paid_this_month,
+    }
+    with open(os.path.join(temporary_path, "meta.json"), "w") as file:
+        json.dump(meta, file)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary_path, path)
+
+def load_snapshot(path: str) -> "Interpreter":
+    from . import Interpreter
+
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+
+    interpreter = Interpreter()
+    interpreter.month_counter = meta["month_counter"]
+    interpreter.users = meta["users"]
+    interpreter.loans = [
+        Loan(
+            id=id,
+            name=name,
+            amount=amount,
+            interest_rate=interest_rate,
+            creator=creator,
+            month_created=month_created,
+            is_fixed_interest=is_fixed_interest,
+        )
+        for (id, (name, amount, interest_rate, creator, month_created, is_fixed_interest, _)) in enumerate(meta["loans"])
+    ]
+    for (loan, fields) in zip(interpreter.loans, meta["loans"]):
+        loan.is_finished = fields[-1]
+
+    # The columns stay memory mapped until the ledger first needs to grow
+    columns = [np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") for column in ledger_columns]
+    ledger = PaymentLedger.from_columns(
+        *columns,
+        loan_names=StringInterner.from_strings(meta["loan_names"]),
+        usernames=StringInterner.from_strings(meta["usernames"]),
+    )
+    interpreter.loan_payments = ledger
+    interpreter.paid_this_month = meta["paid_this_month"]
+    interpreter.forecaster = load_forecaster(path, meta["forecaster"])
+    interpreter.balances = BalanceEngine.from_loans(
+        interpreter.loans,
+        np.load(os.path.join(path, "balances.npy")),
+    )
+    return interpreter
+
+def load_forecaster(path: str, sums: dict) -> MonthlyForecaster:
+    forecaster = MonthlyForecaster(sums["decay"])
+    for name in forecaster_sums:
+        setattr(forecaster, name, sums[name])
+    # Copy-on-write maps, as payments and months update the arrays in place
+    for array in forecaster_arrays:
+        setattr(forecaster, array, np.load(os.path.join(path, f"{array}.npy"), mmap_mode="c"))
+    return forecaster
@@ -0,0 +1,216 @@
+from typing import Container, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+
+from .models import LoanPayment
+
+initial_capacity = 1024
+# Payments built from each slice of the columns when iterating
+block_size = 4096
+
+
+class StringInterner:
+    """Maps strings to dense integer ids so they can be stored in arrays."""
+    ids: Dict[str, int]
+    strings: List[str]
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, string: str) -> int:
+        id = self.ids.get(string)
+        if id is None:
+            id = len(self.strings)
+            self.ids[string] = id
+            self.strings.append(string)
+        return id
+
+    @classmethod
+    def from_strings(cls, strings: List[str]) -> "StringInterner":
+        interner = cls()
+        interner.strings = list(strings)
+        interner.ids = {string: id for (id, string) in enumerate(interner.strings)}
+        return interner
+
+    def __getitem__(self, id: int) -> str:
+        return self.strings[id]
+
+    def __contains__(self, string: str) -> bool:
+        return string in self.ids
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class PaymentLedger:
+    """
+    Append-only, columnar store of loan payments.
+
+    Every payment takes one slot in each of the `amounts`, `months`, `loan_ids`
+    and `user_ids` arrays, which double in size whenever they fill up. Loan
+    names and usernames are interned so only their integer ids are stored per
+    payment.
+    """
+    size: int
+    amounts: np.ndarray
+    months: np.ndarray
+    loan_ids: np.ndarray
+    user_ids: np.ndarray
+    loan_names: StringInterner
+    usernames: StringInterner
+
+    def __init__(self, capacity: int = initial_capacity):
+        self.size       = 0
+        self.amounts    = np.empty(capacity, dtype=np.float64)
+        self.months     = np.empty(capacity, dtype=np.int32)
+        self.loan_ids   = np.empty(capacity, dtype=np.int32)
+        self.user_ids   = np.empty(capacity, dtype=np.int32)
+        self.loan_names = StringInterner()
+        self.usernames  = StringInterner()
+
+    @classmethod
+    def from_columns(
+        cls,
+        amounts: np.ndarray,
+        months: np.ndarray,
+        loan_ids: np.ndarray,
+        user_ids: np.ndarray,
+        loan_names: StringInterner,
+        usernames: StringInterner,
+    ) -> "PaymentLedger":
+        """
+        Wraps existing (possibly read-only or memory mapped) columns. They are
+        only copied once the ledger has to grow.
+        """
+        ledger = cls(capacity=0)
+        ledger.size       = len(amounts)
+        ledger.amounts    = amounts
+        ledger.months     = months
+        ledger.loan_ids   = loan_ids
+        ledger.user_ids   = user_ids
+        ledger.loan_names = loan_names
+        ledger.usernames  = usernames
+        return ledger
+
+    def _grow(self, capacity: int):
+        for column in ("amounts", "months", "loan_ids", "user_ids"):
+            old = getattr(self, column)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
+
+    def append(self, loan_name: str, username: str, amount: float, month: int) -> int:
+        """Records a payment and returns its id."""
+        id = self.size
+        if id == len(self.amounts):
+            self._grow(max(2 * id, initial_capacity))
+
+        self.amounts[id]  = amount
+        self.months[id]   = month
+        self.loan_ids[id] = self.loan_names.intern(loan_name)
+        self.user_ids[id] = self.usernames.intern(username)
+        self.size += 1
+        return id
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, id: int) -> LoanPayment:
+        if not 0 <= id < self.size:
+            raise IndexError(f"payment {id} does not exist")
+
+        return LoanPayment(
+            id=id,
+            amount=float(self.amounts[id]),
+            loan_name=self.loan_names[self.loan_ids[id]],
+            user_id=self.usernames[self.user_ids[id]],
+            month_created=int(self.months[id]),
+        )
+
+    def __iter__(self) -> Iterator[LoanPayment]:
+        return self.page()
+
+    def page(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[LoanPayment]:
+        """
+        The `limit` payments after the first `offset`. Only those payments are
+        built, from slices of the columns a block at a time.
+        """
+        stop = self.size if limit is None else min(self.size, offset + limit)
+        for start in range(offset, stop, block_size):
+            end = min(start + block_size, stop)
+            yield from build_payments(
+                start,
+                self.amounts[start:end], self.months[start:end], self.loan_ids[start:end], self.user_ids[start:end],
+                self.loan_names, self.usernames,
+            )
+
+    def monthly_totals(self, number_of_months: int = 0) -> np.ndarray:
+        """Total paid in each month, at least `number_of_months` long."""
+        return np.bincount(
+            self.months[:self.size],
+            weights=self.amounts[:self.size],
+            minlength=number_of_months,
+        )
+
+    def loan_totals(self) -> np.ndarray:
+        """Total paid towards each loan, indexed by interned loan id."""
+        return np.bincount(
+            self.loan_ids[:self.size],
+            weights=self.amounts[:self.size],
+            minlength=len(self.loan_names),
+        )
+
+    def user_totals(self) -> np.ndarray:
+        """Total paid by each user, indexed by interned user id."""
+        return np.bincount(
+            self.user_ids[:self.size],
+            weights=self.amounts[:self.size],
+            minlength=len(self.usernames),
+        )
+
+    def loan_monthly_totals(self, loan_names: Optional[Iterable[str]] = None, first_month: int = 0) -> Dict[str, Dict[int, float]]:
+        """
+        Total paid towards each loan in each month from `first_month` on,
+        keyed by loan name, for `loan_names` (by default every loan).
+        """
+        # Payments are appended month by month, so only the months asked for are read
+        start = int(np.searchsorted(self.months[:self.size], first_month))
+        (amounts, months, loan_ids) = (self.amounts[start:self.size], self.months[start:self.size], self.loan_ids[start:self.size])
+        if loan_names is not None:
+            ids = [id for id in map(self.loan_names.ids.get, loan_names) if id is not None]
+            selected = np.isin(loan_ids, ids)
+            (amounts, months, loan_ids) = (amounts[selected], months[selected], loan_ids[selected])
+        number_of_months = int(months.max()) + 1 if len(months) else 1
+
+        keys = loan_ids.astype(np.int64) * number_of_months + months
+        (unique_keys, inverse) = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=amounts)
+
+        index = {}
+        for (key, total) in zip(unique_keys.tolist(), totals.tolist()):
+            (loan_id, month) = divmod(key, number_of_months)
+            index.setdefault(self.loan_names[loan_id], {})[month] = total
+        return index
+
+
+def build_payments(
+    first: int,
+    amounts: np.ndarray,
+    months: np.ndarray,
+    loan_ids: np.ndarray,
+    user_ids: np.ndarray,
+    loan_names: StringInterner,
+    usernames: StringInterner,
+    skipped: Container[int] = (),
+) -> Iterator[LoanPayment]:
+    """The payments in a slice of ledger columns, starting with id `first` and leaving out those `skipped`."""
+    rows = zip(amounts.tolist(), months.tolist(), loan_ids.tolist(), user_ids.tolist())
+    for (id, (amount, month, loan_id, user_id)) in enumerate(rows, first):
+        if id not in skipped:
+            yield LoanPayment(
+                id=id,
+                amount=amount,
+                loan_name=loan_names[loan_id],
+                user_id=usernames[user_id],
+                month_created=month,
+            )
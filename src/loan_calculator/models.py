@@ -0,0 +1,33 @@
+class Loan:
+    id: int
+    name: str 
+    amount: float
+    interest_rate: float
+    creator: str
+    month_created: int
+    is_fixed_interest: bool
+    is_finished: bool
+
+    def __init__(self, id: int, name: str, amount: float, interest_rate: float, creator: str, month_created: int, is_fixed_interest: bool):
+        self.id = id
+        self.name = name
+        self.amount = amount
+        self.interest_rate = interest_rate
+        self.creator = creator
+        self.month_created = month_created
+        self.is_fixed_interest = is_fixed_interest
+        self.is_finished = False
+
+class LoanPayment:
+    id: int
+    loan_name: int
+    amount: float
+    creator: str
+    month_created: int
+
+    def __init__(self, id: int, amount: float, loan_name: int, user_id: str, month_created: int):
+        self.id = id
+        self.loan_name = loan_name
+        self.amount = amount
+        self.user_id = user_id
+        self.month_created = month_created
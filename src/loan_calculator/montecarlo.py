@@ -0,0 +1,151 @@
+"""
+Monte Carlo simulation of how the loan book will actually be repaid.
+
+Every month each unfinished loan is charged interest (see `BalanceEngine`)
+and then, independently of every other loan:
+
+- misses its payment with probability `miss_probability`,
+- pays off everything it owes with probability `prepay_probability`,
+- otherwise makes its scheduled payment (or whatever is left, if less).
+
+Replications are simulated in batches, each vectorized over loans and
+replications, and batches are spread over a process pool. Every batch draws
+from its own `SeedSequence` child, so a given seed always gives the same
+results no matter how many workers are used.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+import numpy as np
+
+if TYPE_CHECKING:
+    from . import Interpreter
+
+default_percentiles = (5, 25, 50, 75, 95)
+
+
+class CashFlowBands:
+    percentiles: Tuple[float, ...]
+    # bands[i, t] is the percentiles[i]-th percentile of the cash flow in month t
+    bands: np.ndarray
+    mean: np.ndarray
+    replications: int
+
+    def __init__(self, percentiles: Sequence[float], bands: np.ndarray, mean: np.ndarray, replications: int):
+        self.percentiles = tuple(percentiles)
+        self.bands = bands
+        self.mean = mean
+        self.replications = replications
+
+    def band(self, percentile: float) -> np.ndarray:
+        return self.bands[self.percentiles.index(percentile)]
+
+
+def simulate_batch(
+    seed: np.random.SeedSequence,
+    replications: int,
+    balances: np.ndarray,
+    growth_rates: np.ndarray,
+    monthly_interest: np.ndarray,
+    scheduled_payments: np.ndarray,
+    months: int,
+    miss_probability: float,
+    prepay_probability: float,
+) -> np.ndarray:
+    """Returns the total cash flow of each replication in each month."""
+    rng = np.random.default_rng(seed)
+
+    balances = np.tile(balances, (replications, 1))
+    cash_flows = np.empty((replications, months))
+
+    for month in range(months):
+        active = balances < 0
+        balances = np.where(active, balances * growth_rates - monthly_interest, balances)
+        owed = np.where(active, -balances, 0)
+
+        outcome = rng.random(balances.shape)
+        payments = np.where(
+            outcome < miss_probability,
+            0,
+            np.where(
+                outcome < miss_probability + prepay_probability,
+                owed,
+                np.minimum(scheduled_payments, owed),
+            ),
+        )
+
+        balances += payments
+        cash_flows[:, month] = payments.sum(axis=1)
+
+    return cash_flows
+
+def simulate_cash_flows(
+    balances: np.ndarray,
+    growth_rates: np.ndarray,
+    monthly_interest: np.ndarray,
+    scheduled_payments: np.ndarray,
+    months: int,
+    replications: int = 1000,
+    miss_probability: float = 0.05,
+    prepay_probability: float = 0.005,
+    percentiles: Sequence[float] = default_percentiles,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    batch_size: int = 32,
+) -> CashFlowBands:
+    """
+    Simulates `replications` paths of the book's monthly cash flow over the
+    next `months` months and summarises them as percentile bands.
+    `workers=1` runs every batch in this process.
+    """
+    batch_sizes = [
+        min(batch_size, replications - start)
+        for start in range(0, replications, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    arguments = (
+        np.asarray(balances, dtype=np.float64),
+        np.asarray(growth_rates, dtype=np.float64),
+        np.asarray(monthly_interest, dtype=np.float64),
+        np.asarray(scheduled_payments, dtype=np.float64),
+        months,
+        miss_probability,
+        prepay_probability,
+    )
+
+    if workers == 1:
+        batches = [simulate_batch(seed, size, *arguments) for (seed, size) in zip(seeds, batch_sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(simulate_batch, seed, size, *arguments)
+                for (seed, size) in zip(seeds, batch_sizes)
+            ]
+            batches = [future.result() for future in futures]
+
+    cash_flows = np.concatenate(batches)
+    return CashFlowBands(
+        percentiles,
+        np.percentile(cash_flows, percentiles, axis=0),
+        cash_flows.mean(axis=0),
+        replications,
+    )
+
+def simulate_loan_book(interpreter: "Interpreter", months: int, **options) -> CashFlowBands:
+    """
+    Runs `simulate_cash_flows` on the interpreter's loans, scheduling each
+    loan's average monthly payment so far.
+    """
+    balances = interpreter.loan_balances()
+    (growth_rates, monthly_interest) = interpreter.loan_growth_terms()
+    scheduled_payments = interpreter.average_monthly_payments()
+    if not len(balances) == len(growth_rates) == len(scheduled_payments) == interpreter.count_loans():
+        raise ValueError("the interpreter doesn't have a balance and terms for every loan")
+
+    return simulate_cash_flows(
+        balances,
+        growth_rates,
+        monthly_interest,
+        scheduled_payments,
+        months,
+        **options,
+    )
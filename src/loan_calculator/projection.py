@@ -0,0 +1,149 @@
+"""
+Vectorized balance projections for a whole portfolio of loans.
+
+Every loan follows the same monthly rules as `BalanceEngine`: at the start of
+month `t` an unfinished loan is charged interest, then that month's payment is
+added,
+
+    B[t] = B[t-1] * growth_rate - monthly_interest + payment[t]
+
+and the loan is finished as soon as `B[t] >= 0`, after which payments simply
+carry over. The projection steps every loan through one month at a time with
+a handful of array operations, keeping only the current balances, so by
+default it returns the amount outstanding in each month and the month each
+loan is finished in. The full (loans, months + 1) matrix of balances is only
+kept when asked for.
+"""
+from typing import Optional
+import numpy as np
+
+
+class PortfolioProjection:
+    # outstanding[t] is the amount owed across the portfolio t months from now (index 0 is now)
+    outstanding: np.ndarray
+    # The month each loan is finished in, or -1 if it isn't within the horizon
+    finished_months: np.ndarray
+    # balances[i, t] is loan i's balance t months from now, if it was kept
+    balances: Optional[np.ndarray]
+
+    def __init__(self, outstanding: np.ndarray, finished_months: np.ndarray, balances: Optional[np.ndarray] = None):
+        self.outstanding = outstanding
+        self.finished_months = finished_months
+        self.balances = balances
+
+    def total_outstanding(self) -> np.ndarray:
+        """Amount owed across the portfolio in each month."""
+        return self.outstanding
+
+
+def project_balances(
+    balances: np.ndarray,
+    principals: np.ndarray,
+    interest_rates: np.ndarray,
+    is_fixed_interest: np.ndarray,
+    scheduled_payments: np.ndarray,
+    months: int,
+    start_months: Optional[np.ndarray] = None,
+    keep_balances: bool = False,
+) -> PortfolioProjection:
+    """
+    Projects `months` months of balances for every loan.
+
+    `interest_rates` are monthly percentages, charged on the principal for
+    fixed interest loans and compounded on the balance otherwise.
+    `scheduled_payments` is either one payment per loan per month, shape
+    `(loans,)`, or a full schedule of shape `(loans, months)`. Loans with a
+    `start_month` only begin that many months from now; their balance is NaN
+    until then. Every month's balances are only kept if `keep_balances` is set.
+    """
+    balances           = np.asarray(balances, dtype=np.float64)
+    principals         = np.asarray(principals, dtype=np.float64)
+    interest_rates     = np.asarray(interest_rates, dtype=np.float64)
+    is_fixed_interest  = np.asarray(is_fixed_interest, dtype=bool)
+    scheduled_payments = np.asarray(scheduled_payments, dtype=np.float64)
+    if scheduled_payments.ndim < 2:
+        scheduled_payments = np.broadcast_to(scheduled_payments, balances.shape)[:, None]
+    has_schedule = scheduled_payments.shape[1] > 1
+
+    growth_rates     = np.where(is_fixed_interest, 1, 1 + interest_rates / 100)
+    monthly_interest = np.where(is_fixed_interest, principals * interest_rates / 100, 0)
+
+    number_of_loans = len(balances)
+    loans = np.arange(number_of_loans)
+    outstanding = np.empty(months + 1)
+    finished_months = np.full(number_of_loans, -1, dtype=np.int64)
+    # Filled a month (row) at a time, and handed back transposed to (loans, months + 1)
+    kept = np.empty((months + 1, number_of_loans)) if keep_balances else None
+
+    if start_months is None:
+        current = balances.copy()
+        unfinished = current < 0
+        finished_months[~unfinished] = 0
+        # Finished loans are charged no more interest, so their terms become neutral
+        growth_rates[~unfinished] = 1
+        monthly_interest[~unfinished] = 0
+    else:
+        start_months = np.asarray(start_months, dtype=np.int64)
+        current = np.full(number_of_loans, np.nan)
+        unfinished = np.zeros(number_of_loans, dtype=bool)
+
+    owed = np.empty(number_of_loans)
+    for month in range(months + 1):
+        if month > 0:
+            if not has_schedule:
+                payments = scheduled_payments[:, 0]
+            elif start_months is None:
+                payments = scheduled_payments[:, month - 1]
+            else:
+                payments = scheduled_payments[loans, np.clip(month - 1 - start_months, 0, months - 1)]
+            current *= growth_rates
+            current -= monthly_interest
+            # Loans that haven't started are NaN, so paying them changes nothing
+            current += payments
+
+            paid_off = unfinished & (current >= 0)
+            if paid_off.any():
+                finished_months[paid_off] = month
+                unfinished &= ~paid_off
+                growth_rates[paid_off] = 1
+                monthly_interest[paid_off] = 0
+
+        if start_months is not None:
+            # Loans starting this month begin at their current balance, with no payment yet
+            starting = start_months == month
+            if starting.any():
+                current[starting] = balances[starting]
+                unfinished |= starting & (balances < 0)
+                paid = starting & (balances >= 0)
+                finished_months[paid] = month
+                growth_rates[paid] = 1
+                monthly_interest[paid] = 0
+
+        # fmin counts the NaN balances of loans yet to start as 0
+        outstanding[month] = -np.fmin(current, 0, out=owed).sum()
+        if kept is not None:
+            kept[month] = current
+
+    return PortfolioProjection(outstanding, finished_months, None if kept is None else kept.T)
+
+def amortization_schedules(
+    principals: np.ndarray,
+    interest_rates: np.ndarray,
+    is_fixed_interest: np.ndarray,
+    scheduled_payments: np.ndarray,
+    months: int,
+    start_months: Optional[np.ndarray] = None,
+    keep_balances: bool = False,
+) -> PortfolioProjection:
+    """Full schedules for loans that start out owing their whole principal."""
+    principals = np.asarray(principals, dtype=np.float64)
+    return project_balances(
+        -principals,
+        principals,
+        interest_rates,
+        is_fixed_interest,
+        scheduled_payments,
+        months,
+        start_months=start_months,
+        keep_balances=keep_balances,
+    )
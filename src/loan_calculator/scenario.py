@@ -0,0 +1,413 @@
+"""
+What-if forks of a loan book.
+
+`Interpreter.fork` returns a `Scenario`: an interpreter that starts out with
+the book's state and can be changed like it (payments, loans, months), and
+also asked what would happen if a loan's interest rate changed or some
+payments were never made, all without touching the book it came from.
+
+A scenario stores only its own changes. Users, loans, payments and interned
+names are only ever appended to, so a scenario reads the first n of the
+book's and keeps the ones it adds itself; loans it changes are replaced by
+its own copies. The balance engine and forecaster share their arrays with
+the book until either side changes them, when that side copies them (a copy
+per loan, not per payment). Forks of scenarios share the same underlying
+book, plus the forked scenario's changes.
+
+Changing a rate or skipping payments replays the balances of the loans
+involved from the payments left in the scenario (see `replay_loan_balance`).
+A loan's `is_finished` always follows the scenario's own balances, even
+for loans the book has finished since.
+"""
+import copy
+from bisect import bisect_right
+from collections.abc import MutableMapping, Sequence
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from . import Interpreter
+from .engine import BalanceEngine, replay_loan_balance
+from .ledger import PaymentLedger, StringInterner, build_payments
+from .models import Loan, LoanPayment
+
+
+class ForkedSequence(Sequence):
+    """
+    The first `base_size` items of an append-only `base`, followed by items of
+    its own. Replacing an item only replaces it here.
+    """
+    base: Sequence
+    base_size: int
+    items: list
+    replaced: dict
+
+    def __init__(self, base: Sequence):
+        if isinstance(base, ForkedSequence):
+            # Fork the underlying sequence, with a copy of the fork's changes
+            (self.base, self.base_size) = (base.base, base.base_size)
+            self.items = list(base.items)
+            self.replaced = dict(base.replaced)
+        else:
+            (self.base, self.base_size) = (base, len(base))
+            self.items = []
+            self.replaced = {}
+
+    def __len__(self) -> int:
+        return self.base_size + len(self.items)
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        return index
+
+    def __getitem__(self, index: int):
+        index = self._index(index)
+        if index in self.replaced:
+            return self.replaced[index]
+        if index < self.base_size:
+            return self.base[index]
+        return self.items[index - self.base_size]
+
+    def __setitem__(self, index: int, item):
+        self.replaced[self._index(index)] = item
+
+    def __iter__(self):
+        replaced = self.replaced
+        for (index, item) in enumerate(islice(self.base, self.base_size)):
+            yield replaced.get(index, item) if replaced else item
+        for (index, item) in enumerate(self.items, self.base_size):
+            yield replaced.get(index, item) if replaced else item
+
+    def append(self, item):
+        self.items.append(item)
+
+
+class ForkedLoans(ForkedSequence):
+    """
+    A scenario's loans, whose `is_finished` follows the scenario's balance
+    engine: a loan the book finishes after the fork comes out as a copy that
+    is still outstanding.
+    """
+    engine: BalanceEngine
+
+    def __init__(self, base: Sequence, engine: BalanceEngine):
+        super().__init__(base)
+        self.engine = engine
+
+    def _with_finished_flag(self, loan: Loan) -> Loan:
+        is_finished = loan.id not in self.engine.active
+        if loan.is_finished != is_finished:
+            loan = copy.copy(loan)
+            loan.is_finished = is_finished
+        return loan
+
+    def __getitem__(self, index: int) -> Loan:
+        return self._with_finished_flag(super().__getitem__(index))
+
+    def __iter__(self) -> Iterator[Loan]:
+        return map(self._with_finished_flag, super().__iter__())
+
+
+class ForkedIds(MutableMapping):
+    """A string interner's ids: those of the first `base_size` strings of `base`, and its own."""
+    base: Dict[str, int]
+    base_size: int
+    own: Dict[str, int]
+
+    def __init__(self, base: Dict[str, int], base_size: int, own: Optional[Dict[str, int]] = None):
+        self.base = base
+        self.base_size = base_size
+        self.own = {} if own is None else own
+
+    def __getitem__(self, string: str) -> int:
+        id = self.own.get(string)
+        if id is None:
+            id = self.base.get(string)
+            if id is None or id >= self.base_size:
+                raise KeyError(string)
+        return id
+
+    def get(self, string: str, default=None):
+        try:
+            return self[string]
+        except KeyError:
+            return default
+
+    def __setitem__(self, string: str, id: int):
+        self.own[string] = id
+
+    def __delitem__(self, string: str):
+        del self.own[string]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from (string for (string, id) in self.base.items() if id < self.base_size)
+        yield from self.own
+
+    def __len__(self) -> int:
+        return self.base_size + len(self.own)
+
+
+def fork_interner(interner: StringInterner) -> StringInterner:
+    forked = StringInterner()
+    forked.strings = ForkedSequence(interner.strings)
+    if isinstance(interner.ids, ForkedIds):
+        forked.ids = ForkedIds(interner.ids.base, interner.ids.base_size, dict(interner.ids.own))
+    else:
+        forked.ids = ForkedIds(interner.ids, len(interner.strings))
+    return forked
+
+
+class LedgerFork:
+    """
+    A payment ledger that reads the payments of the ledger it was forked from
+    and appends its own to a ledger of its own. Skipped payments keep their
+    ids but are left out of iteration and every total.
+    """
+    # (first id, amounts, months, loan ids, user ids) of the shared payments
+    segments: List[Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]
+    base_size: int
+    own: PaymentLedger
+    skipped: Set[int]
+    loan_names: StringInterner
+    usernames: StringInterner
+
+    def __init__(self, ledger):
+        if isinstance(ledger, LedgerFork):
+            self.segments = ledger.segments + ledger._own_segment()
+            self.base_size = len(ledger.own) + ledger.base_size
+            self.skipped = set(ledger.skipped)
+        else:
+            size = len(ledger)
+            self.segments = [(0, ledger.amounts[:size], ledger.months[:size], ledger.loan_ids[:size], ledger.user_ids[:size])]
+            self.base_size = size
+            self.skipped = set()
+
+        self.loan_names = fork_interner(ledger.loan_names)
+        self.usernames = fork_interner(ledger.usernames)
+        self.own = PaymentLedger(capacity=0)
+        (self.own.loan_names, self.own.usernames) = (self.loan_names, self.usernames)
+
+    def _own_segment(self) -> list:
+        own = self.own
+        if own.size == 0:
+            return []
+        size = own.size
+        return [(self.base_size, own.amounts[:size], own.months[:size], own.loan_ids[:size], own.user_ids[:size])]
+
+    def _columns(self) -> list:
+        return self.segments + self._own_segment()
+
+    def _weights(self, first: int, amounts: np.ndarray) -> np.ndarray:
+        """`amounts` with the skipped payments' zeroed."""
+        skipped = [id - first for id in self.skipped if first <= id < first + len(amounts)]
+        if not skipped:
+            return amounts
+        amounts = amounts.copy()
+        amounts[skipped] = 0
+        return amounts
+
+    def append(self, loan_name: str, username: str, amount: float, month: int) -> int:
+        return self.base_size + self.own.append(loan_name, username, amount, month)
+
+    def skip(self, ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Skips payments, returning the (amounts, months, loan ids, user ids) of the ones skipped."""
+        ids = sorted(set(ids))
+        for id in ids:
+            if id in self.skipped or not 0 <= id < self.base_size + len(self.own):
+                raise IndexError(f"payment {id} does not exist")
+
+        columns = self._columns()
+        firsts = [first for (first, *_) in columns]
+        rows = []
+        for id in ids:
+            (first, *arrays) = columns[bisect_right(firsts, id) - 1]
+            rows.append([array[id - first] for array in arrays])
+        self.skipped.update(ids)
+
+        return tuple(
+            np.array([row[i] for row in rows], dtype=dtype)
+            for (i, dtype) in enumerate((np.float64, np.int64, np.int64, np.int64))
+        )
+
+    def __len__(self) -> int:
+        return self.base_size + len(self.own) - len(self.skipped)
+
+    def __getitem__(self, id: int) -> LoanPayment:
+        if id in self.skipped or not 0 <= id < self.base_size + len(self.own):
+            raise IndexError(f"payment {id} does not exist")
+
+        columns = self._columns()
+        (first, amounts, months, loan_ids, user_ids) = columns[bisect_right([first for (first, *_) in columns], id) - 1]
+        i = id - first
+        return LoanPayment(
+            id=id,
+            amount=float(amounts[i]),
+            loan_name=self.loan_names[loan_ids[i]],
+            user_id=self.usernames[user_ids[i]],
+            month_created=int(months[i]),
+        )
+
+    def __iter__(self) -> Iterator[LoanPayment]:
+        for (first, *columns) in self._columns():
+            yield from build_payments(first, *columns, self.loan_names, self.usernames, self.skipped)
+
+    def page(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[LoanPayment]:
+        """The `limit` payments after the first `offset`, like `PaymentLedger.page`."""
+        if self.skipped:
+            # Ids no longer match positions, so the payments before the page have to be counted
+            return islice(self, offset, None if limit is None else offset + limit)
+        stop = self.base_size + len(self.own) if limit is None else offset + limit
+        return (
+            payment
+            for (first, *columns) in self._columns()
+            if first < stop and first + len(columns[0]) > offset
+            for payment in build_payments(
+                max(first, offset),
+                *(column[max(offset - first, 0):stop - first] for column in columns),
+                self.loan_names, self.usernames,
+            )
+        )
+
+    def _totals(self, column: int, minlength: int) -> np.ndarray:
+        """Totals of the payments' amounts by one of the segments' key columns."""
+        totals = np.zeros(minlength)
+        for segment in self._columns():
+            counts = np.bincount(segment[column], weights=self._weights(segment[0], segment[1]), minlength=len(totals))
+            counts[:len(totals)] += totals
+            totals = counts
+        return totals
+
+    def monthly_totals(self, number_of_months: int = 0) -> np.ndarray:
+        return self._totals(2, number_of_months)
+
+    def loan_totals(self) -> np.ndarray:
+        return self._totals(3, len(self.loan_names))
+
+    def user_totals(self) -> np.ndarray:
+        return self._totals(4, len(self.usernames))
+
+    def loan_monthly_totals(self, loan_names: Optional[Iterable[str]] = None, first_month: int = 0) -> Dict[str, Dict[int, float]]:
+        """
+        Total paid towards each loan in each month from `first_month` on, for
+        `loan_names` (by default every loan).
+        """
+        ids = None
+        if loan_names is not None:
+            ids = np.array([id for id in map(self.loan_names.ids.get, loan_names) if id is not None], dtype=np.int64)
+
+        index = {}
+        for (first, amounts, months, loan_ids, _) in self._columns():
+            # Payments are appended month by month, so a month's are contiguous
+            start = int(np.searchsorted(months, first_month))
+            (amounts, months, loan_ids) = (self._weights(first, amounts)[start:], months[start:], loan_ids[start:])
+            if ids is not None:
+                selected = np.isin(loan_ids, ids)
+                (amounts, months, loan_ids) = (amounts[selected], months[selected], loan_ids[selected])
+            for (loan_id, month, amount) in zip(loan_ids.tolist(), months.tolist(), amounts.tolist()):
+                monthly_totals = index.setdefault(self.loan_names[loan_id], {})
+                monthly_totals[month] = monthly_totals.get(month, 0) + amount
+        return index
+
+
+class Scenario(Interpreter):
+    """
+    An interpreter forked from another (see the module docstring). Its
+    changes are never journalled.
+    """
+    # Slot -> month -> (interest_rate, is_fixed_interest) charged from the end of that month
+    rate_changes: Dict[int, Dict[int, Tuple[float, bool]]]
+
+    def __init__(self, interpreter: Interpreter):
+        # Not `Interpreter.__init__`, which would start an empty book
+        self.month_counter       = interpreter.month_counter
+        self.users               = ForkedSequence(interpreter.users)
+        self.balances            = interpreter.balances.fork()
+        self.loans               = ForkedLoans(interpreter.loans, self.balances)
+        self.loan_payments       = LedgerFork(interpreter.loan_payments)
+        # Unused: `amount_paid_this_month` asks the ledger, which leaves out skipped payments
+        self.paid_this_month     = {}
+        self.forecaster          = interpreter.forecaster.fork()
+        self.journal             = None
+        self.metrics             = None
+        self.output_format       = interpreter.output_format
+        self.rate_changes        = {
+            slot: dict(changes)
+            for (slot, changes) in getattr(interpreter, "rate_changes", {}).items()
+        }
+
+    def mark_finished(self, slots: List[int]):
+        for slot in slots:
+            self._replace_loan(slot, is_finished=True)
+
+    def _replace_loan(self, slot: int, **fields) -> Loan:
+        loan = copy.copy(self.loans[slot])
+        for (field, value) in fields.items():
+            setattr(loan, field, value)
+        self.loans[slot] = loan
+        return loan
+
+    def amount_paid_this_month(self, loan_name: str) -> float:
+        month_totals = self.loan_payments.loan_monthly_totals([loan_name], first_month=self.month_counter)
+        return month_totals.get(loan_name, {}).get(self.month_counter, 0)
+
+    def recompute_loan_balance(self, loan: Loan) -> float:
+        monthly_totals = self.loan_payments.loan_monthly_totals([loan.name], first_month=loan.month_created)
+        return replay_loan_balance(loan, monthly_totals.get(loan.name, {}), self.month_counter, self.rate_changes.get(loan.id))
+
+    def _replay_balances(self, slots: Iterable[int]):
+        loans = [self.loans[slot] for slot in slots]
+        if not loans:
+            return
+        monthly_totals = self.loan_payments.loan_monthly_totals(
+            {loan.name for loan in loans},
+            first_month=min(loan.month_created for loan in loans),
+        )
+        for loan in loans:
+            balance = replay_loan_balance(loan, monthly_totals.get(loan.name, {}), self.month_counter, self.rate_changes.get(loan.id))
+            is_finished = self.balances.set_balance(loan.id, balance)
+            if is_finished != loan.is_finished:
+                self._replace_loan(loan.id, is_finished=is_finished)
+
+    def change_interest_rate(self, loan_name: str, interest_rate: float, is_fixed_interest: Optional[bool] = None, since: Optional[int] = None) -> List[int]:
+        """
+        Charges the loans named `loan_name` `interest_rate` from the end of
+        month `since` (by default the current one) on, replaying their
+        balances if that is in the past. Returns the loans' slots.
+        """
+        since = self.month_counter if since is None else since
+        if since > self.month_counter:
+            raise ValueError("rate changes can only start in the current month or earlier")
+        slots = self.balances.slots_by_name.get(loan_name, [])
+
+        for slot in slots:
+            loan = self.loans[slot]
+            changes = self.rate_changes.setdefault(slot, {loan.month_created: (loan.interest_rate, loan.is_fixed_interest)})
+            month = max(since, loan.month_created)
+            # A change replaces any that were due after it
+            for later in [later for later in changes if later > month]:
+                del changes[later]
+            fixed = loan.is_fixed_interest if is_fixed_interest is None else is_fixed_interest
+            changes[month] = (interest_rate, fixed)
+
+            loan = self._replace_loan(slot, interest_rate=interest_rate, is_fixed_interest=fixed)
+            self.balances.set_terms(slot, loan)
+
+        if since < self.month_counter:
+            self._replay_balances(slots)
+        return slots
+
+    def skip_payments(self, payment_ids: Iterable[int]):
+        """Takes payments out of the book as if they had never been made."""
+        (amounts, months, loan_ids, user_ids) = self.loan_payments.skip(payment_ids)
+        if len(amounts) == 0:
+            return
+        self.forecaster.add_payments(months, -amounts, loan_ids, user_ids)
+
+        loan_names = {self.loan_payments.loan_names[loan_id] for loan_id in set(loan_ids.tolist())}
+        self._replay_balances(
+            slot for loan_name in loan_names for slot in self.balances.slots_by_name.get(loan_name, [])
+        )
@@ -0,0 +1,242 @@
+"""
+A riba server for many concurrent clients, over TCP or a Unix socket.
+
+Clients send commands in the batch format (see `batch`), one per line, plus
+the read-only commands:
+
+    2                                       list users
+    4                                       list loans
+    6                                       list loan payments
+    7                                       list loan balances
+    8 <months>                              predict monthly payments
+
+Every command gets a status line, `ok <n>` followed by n tab-separated data
+lines, or `error <message>`; so does a line that is too long or isn't UTF-8,
+which is skipped. Mutations are queued and applied in order by a
+single writer task, which checkpoints whenever the queue runs dry, so many
+clients' changes share one journal flush. Reads don't wait for the queue:
+they are answered straight away from the current state, a page at a time.
+The ledger only ever grows, so a listing covers exactly the rows that
+existed when it started even if the writer runs between pages.
+"""
+import asyncio
+import sys
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from . import Interpreter
+from .batch import mutation_applier, split_fields
+
+page_size = 4096
+# Enough for hundreds of terminals connecting at once
+backlog = 1024
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """`unix:PATH` is a Unix socket; `HOST:PORT` or `PORT` is a TCP address."""
+    if address.startswith("unix:"):
+        return address[len("unix:"):]
+    (host, _, port) = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+async def read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    The next line, or None at the end of the stream. A line longer than the
+    reader's limit is skipped, to its end, and raises ValueError.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial or None
+    except asyncio.LimitOverrunError as error:
+        overrun = error
+    # The rest of the line may still be arriving
+    while True:
+        await reader.readexactly(overrun.consumed)
+        try:
+            await reader.readuntil(b"\n")
+            break
+        except asyncio.LimitOverrunError as error:
+            overrun = error
+    raise ValueError("line too long")
+
+
+class RibaServer:
+    interpreter: Interpreter
+    # (fields, future) pairs waiting for the writer
+    mutations: asyncio.Queue
+    clients: Set[asyncio.StreamWriter]
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.mutations = None
+        self.clients = set()
+        self._writer_task = None
+
+    async def start(self, address: Union[str, Tuple[str, int]]) -> asyncio.AbstractServer:
+        self.mutations = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._apply_mutations())
+        if isinstance(address, str):
+            return await asyncio.start_unix_server(self.handle_client, path=address, backlog=backlog)
+        (host, port) = address
+        return await asyncio.start_server(self.handle_client, host, port, backlog=backlog)
+
+    async def stop(self):
+        """Disconnects every client and stops the writer, then checkpoints."""
+        for writer in list(self.clients):
+            writer.close()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        # Mutations that were never applied; their clients are disconnected
+        while not self.mutations.empty():
+            (_, result) = self.mutations.get_nowait()
+            result.cancel()
+        self.interpreter.checkpoint()
+
+    async def _apply_mutations(self):
+        interpreter = self.interpreter
+        apply_mutation = mutation_applier(interpreter)
+        mutations = self.mutations
+        while True:
+            (fields, result) = await mutations.get()
+            try:
+                apply_mutation(fields)
+            except Exception as error:
+                if not result.done():
+                    result.set_exception(error)
+            else:
+                if not result.done():
+                    result.set_result(interpreter.month_counter if fields[0].strip() == "0" else None)
+
+            if mutations.empty():
+                interpreter.checkpoint()
+
+    async def mutate(self, fields: List[str]) -> List[str]:
+        result = asyncio.get_running_loop().create_future()
+        await self.mutations.put((fields, result))
+        month_counter = await result
+        return [] if month_counter is None else [str(month_counter)]
+
+    def read(self, fields: List[str]) -> Tuple[int, Iterable[str]]:
+        """The number of rows a read-only command returns, and the rows."""
+        interpreter = self.interpreter
+        code = fields[0].strip()
+
+        if code == "2":
+            (_,) = fields
+            count = interpreter.count_users()
+            return (count, interpreter.iter_users(count))
+
+        if code == "4":
+            (_,) = fields
+            count = interpreter.count_loans()
+            return (count, (
+                f"{loan.name}\t{loan.creator}\t{loan.amount!r}\t{loan.interest_rate!r}\t{'yes' if loan.is_fixed_interest else 'no'}"
+                for loan in interpreter.iter_loans(count)
+            ))
+
+        if code == "6":
+            (_,) = fields
+            count = interpreter.count_loan_payments()
+            return (count, (
+                f"{payment.id}\t{payment.loan_name}\t{payment.user_id}\t{payment.amount!r}\t{payment.month_created}"
+                for payment in interpreter.iter_loan_payments(count)
+            ))
+
+        if code == "7":
+            (_,) = fields
+            # Balances change in place, so they are all read before the first page is sent
+            rows = [
+                f"{loan.name}\t{balance!r}"
+                for (loan, balance) in interpreter.iter_loan_balances(interpreter.count_loans())
+            ]
+            return (len(rows), rows)
+
+        if code == "8":
+            (_, months) = fields
+            monthly_totals = interpreter.predict_monthly_payments(int(months))
+            return (len(monthly_totals), [f"{month}\t{total!r}" for (month, total) in enumerate(monthly_totals.tolist())])
+
+        raise ValueError(f"unknown command {code!r}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.add(writer)
+        try:
+            while True:
+                try:
+                    line = await read_line(reader)
+                    if line is None:
+                        break
+                    fields = split_fields(line.decode())
+                except ValueError as error:
+                    # Too long or not UTF-8: the line is dropped, the connection kept
+                    await self._send_error(writer, error)
+                    continue
+                if not fields:
+                    continue
+                if fields[0] in ("q", "quit"):
+                    break
+
+                try:
+                    if fields[0].strip() in ("0", "1", "3", "5"):
+                        rows = await self.mutate(fields)
+                        (count, rows) = (len(rows), rows)
+                    else:
+                        (count, rows) = self.read(fields)
+                except Exception as error:
+                    await self._send_error(writer, error)
+                    continue
+
+                writer.write(f"ok {count}\n".encode())
+                await self._send_pages(writer, iter(rows))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _send_error(writer: asyncio.StreamWriter, error: Exception):
+        message = str(error).replace("\n", " ") or type(error).__name__
+        writer.write(f"error {message}\n".encode())
+        await writer.drain()
+
+    @staticmethod
+    async def _send_pages(writer: asyncio.StreamWriter, rows: Iterator[str]):
+        while True:
+            page = list(islice(rows, page_size))
+            if page:
+                writer.write(("\n".join(page) + "\n").encode())
+            await writer.drain()
+            if len(page) < page_size:
+                return
+
+
+async def serve(interpreter: Interpreter, address: Union[str, Tuple[str, int]], ready: Optional[asyncio.Event] = None):
+    """Serves `interpreter` at `address` until cancelled."""
+    riba_server = RibaServer(interpreter)
+    server = await riba_server.start(address)
+    if ready is not None:
+        ready.set()
+    try:
+        # Not `serve_forever`, which waits for every client to disconnect when cancelled
+        await asyncio.get_running_loop().create_future()
+    finally:
+        server.close()
+        await riba_server.stop()
+        await server.wait_closed()
+
+def run_server(interpreter: Interpreter, address: str) -> int:
+    address = parse_address(address)
+    print(f"riba: serving on {address if isinstance(address, str) else '%s:%d' % address}", file=sys.stderr)
+    try:
+        asyncio.run(serve(interpreter, address))
+    except KeyboardInterrupt:
+        pass
+    return 0
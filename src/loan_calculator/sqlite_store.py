@@ -0,0 +1,325 @@
+"""
+An `Interpreter` that keeps the loan book in a SQLite database instead of in
+memory, so it can grow larger than RAM.
+
+Users, loans and payments are buffered and written with `executemany` in
+batches. Like `BalanceEngine`, every loan's row keeps its balance and the
+terms it is charged at month end, so payments add to the balances of the
+loans they name, one month's interest is a single `UPDATE` and balances are
+read a page at a time. Monthly totals are answered by aggregate queries over
+the indexes on loan name, user and month.
+"""
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import Interpreter
+from .models import Loan, LoanPayment
+from .engine import loan_terms, replay_loan_balance
+from .forecast import MonthlyForecaster
+from .tables import check_page
+
+schema = """
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    id       INTEGER PRIMARY KEY,
+    username TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS loans (
+    id                INTEGER PRIMARY KEY,
+    name              TEXT NOT NULL,
+    amount            REAL NOT NULL,
+    interest_rate     REAL NOT NULL,
+    creator           TEXT NOT NULL,
+    month_created     INTEGER NOT NULL,
+    is_fixed_interest INTEGER NOT NULL,
+    is_finished       INTEGER NOT NULL,
+    balance           REAL NOT NULL,
+    growth_rate       REAL NOT NULL,
+    monthly_interest  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payments (
+    id        INTEGER PRIMARY KEY,
+    loan_name TEXT NOT NULL,
+    user_id   TEXT NOT NULL,
+    amount    REAL NOT NULL,
+    month     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_by_name      ON users (username);
+CREATE INDEX IF NOT EXISTS loans_by_name      ON loans (name);
+CREATE INDEX IF NOT EXISTS loans_by_finished  ON loans (is_finished);
+CREATE INDEX IF NOT EXISTS payments_by_loan   ON payments (loan_name, month, amount);
+CREATE INDEX IF NOT EXISTS payments_by_user   ON payments (user_id, month, amount);
+CREATE INDEX IF NOT EXISTS payments_by_month  ON payments (month, amount);
+"""
+
+loan_columns = "id, name, amount, interest_rate, creator, month_created, is_fixed_interest, is_finished"
+# Kept up to date like the columns of `BalanceEngine`
+balance_columns = "balance, growth_rate, monthly_interest"
+
+
+def loan_from_row(row: Tuple) -> Loan:
+    (id, name, amount, interest_rate, creator, month_created, is_fixed_interest, is_finished) = row
+    loan = Loan(
+        id=id,
+        name=name,
+        amount=amount,
+        interest_rate=interest_rate,
+        creator=creator,
+        month_created=month_created,
+        is_fixed_interest=bool(is_fixed_interest),
+    )
+    loan.is_finished = bool(is_finished)
+    return loan
+
+
+class SqliteInterpreter(Interpreter):
+    connection: sqlite3.Connection
+    batch_size: int
+    user_count: int
+    loan_count: int
+    payment_count: int
+    pending_users: List[Tuple]
+    pending_loans: List[Tuple]
+    pending_payments: List[Tuple]
+    # Loan name -> total of the buffered payments towards it
+    pending_paid: Dict[str, float]
+    # Loan name -> total paid towards it this month, which new loans start with
+    paid_this_month: Dict[str, float]
+
+    def __init__(self, path: str, batch_size: int = 10_000):
+        super().__init__()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(schema)
+
+        self.batch_size = batch_size
+        self.pending_users = []
+        self.pending_loans = []
+        self.pending_payments = []
+        self.pending_paid = {}
+
+        self.month_counter = self.scalar("SELECT value FROM state WHERE key = 'month_counter'", default=0)
+        self.user_count    = self.scalar("SELECT COUNT(*) FROM users")
+        self.loan_count    = self.scalar("SELECT COUNT(*) FROM loans")
+        self.payment_count = self.scalar("SELECT COALESCE(MAX(id) + 1, 0) FROM payments")
+        self.paid_this_month = dict(self.connection.execute(
+            "SELECT loan_name, SUM(amount) FROM payments WHERE month = ? GROUP BY loan_name",
+            (self.month_counter,)
+        ))
+        self.load_forecaster()
+
+    def load_forecaster(self):
+        """Builds the forecaster from per-loan and per-user monthly totals, interning names as it goes."""
+        self.forecaster = MonthlyForecaster(month=self.month_counter)
+
+        loan_rows = self.connection.execute(
+            "SELECT loan_name, month, SUM(amount) FROM payments GROUP BY loan_name, month"
+        ).fetchall()
+        self.forecaster.add_payments(
+            [month for (_, month, _) in loan_rows],
+            [total for (_, _, total) in loan_rows],
+            loan_ids=[self.loan_payments.loan_names.intern(name) for (name, _, _) in loan_rows],
+        )
+
+        user_rows = self.connection.execute(
+            "SELECT user_id, month, SUM(amount) FROM payments GROUP BY user_id, month"
+        ).fetchall()
+        self.forecaster.add_payments(
+            [month for (_, month, _) in user_rows],
+            [total for (_, _, total) in user_rows],
+            user_ids=[self.loan_payments.usernames.intern(name) for (name, _, _) in user_rows],
+            include_in_total=False,
+        )
+
+    def scalar(self, query: str, parameters: Tuple = (), default=None):
+        row = self.connection.execute(query, parameters).fetchone()
+        return row[0] if row is not None else default
+
+    def flush(self):
+        """Writes every buffered row to the database."""
+        if self.pending_users:
+            self.connection.executemany("INSERT INTO users VALUES (?, ?)", self.pending_users)
+            self.pending_users.clear()
+        if self.pending_loans:
+            self.connection.executemany(
+                f"INSERT INTO loans ({loan_columns}, {balance_columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending_loans,
+            )
+            self.pending_loans.clear()
+        if self.pending_payments:
+            self.connection.executemany("INSERT INTO payments VALUES (?, ?, ?, ?, ?)", self.pending_payments)
+            self.pending_payments.clear()
+        if self.pending_paid:
+            # A loan is finished as soon as its balance is no longer negative
+            self.connection.executemany(
+                "UPDATE loans SET balance = balance + ?1, is_finished = (is_finished OR balance + ?1 >= 0) WHERE name = ?2",
+                [(amount, name) for (name, amount) in self.pending_paid.items()],
+            )
+            self.pending_paid.clear()
+
+    def checkpoint(self):
+        self.flush()
+        self.connection.commit()
+        super().checkpoint()
+
+    def close(self):
+        self.flush()
+        self.connection.commit()
+        super().close()
+        self.connection.close()
+
+    def count_users(self) -> int:
+        return self.user_count
+
+    def count_loans(self) -> int:
+        return self.loan_count
+
+    def count_loan_payments(self) -> int:
+        return self.payment_count
+
+    def fork(self):
+        """SQLite books can't be forked: scenarios share the in-memory loan book, which they don't keep."""
+        raise TypeError("SQLite loan books can't be forked; keep the book in memory (or in --data-dir) for what-if scenarios")
+
+    def increment_month_counter(self):
+        self.check_finished_loans()
+        self.connection.execute(
+            "UPDATE loans SET balance = balance * growth_rate - monthly_interest WHERE is_finished = 0"
+        )
+        self.forecaster.advance_month()
+        self.paid_this_month = {}
+        self.month_counter += 1
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state VALUES ('month_counter', ?)",
+            (self.month_counter,)
+        )
+
+    def create_user(self, username: str):
+        self.pending_users.append((self.user_count, username))
+        self.user_count += 1
+        if len(self.pending_users) >= self.batch_size:
+            self.flush()
+
+    def create_loan(self, name: str, creator: str, amount: float, interest_rate: float, is_fixed_interest: bool):
+        # Buffered payments are added to the new loan's balance when they are written
+        balance = self.paid_this_month.get(name, 0) - self.pending_paid.get(name, 0) - amount
+        self.pending_loans.append((
+            self.loan_count, name, amount, interest_rate, creator, self.month_counter, is_fixed_interest, balance >= 0,
+            balance, *loan_terms(amount, interest_rate, is_fixed_interest),
+        ))
+        self.loan_count += 1
+        if len(self.pending_loans) >= self.batch_size:
+            self.flush()
+
+    def make_loan_payment(self, loan_name: str, username: str, amount: float):
+        self.pending_payments.append((self.payment_count, loan_name, username, amount, self.month_counter))
+        self.pending_paid[loan_name] = self.pending_paid.get(loan_name, 0) + amount
+        self.paid_this_month[loan_name] = self.paid_this_month.get(loan_name, 0) + amount
+        self.payment_count += 1
+        # Only the ledger's interners are used, to give the forecaster its ids
+        self.forecaster.record_payment(
+            self.loan_payments.loan_names.intern(loan_name),
+            self.loan_payments.usernames.intern(username),
+            amount,
+        )
+        if len(self.pending_payments) >= self.batch_size:
+            self.flush()
+
+    def check_finished_loans(self):
+        """Writes the buffered payments, which finish the loans they pay off, and finishes any others that are paid."""
+        self.flush()
+        self.connection.execute("UPDATE loans SET is_finished = 1 WHERE is_finished = 0 AND balance >= 0")
+
+    def check_monthly_totals(self) -> np.ndarray:
+        self.flush()
+        monthly_totals = np.zeros(self.month_counter + 1)
+        for (month, total) in self.connection.execute(
+            "SELECT month, SUM(amount) FROM payments GROUP BY month"
+        ):
+            monthly_totals[month] = total
+        return monthly_totals
+
+    def check_loan_balance(self, loan: Loan) -> float:
+        self.flush()
+        balance = self.scalar("SELECT balance FROM loans WHERE id = ?", (loan.id,))
+        if balance is None:
+            raise IndexError(f"loan {loan.id} does not exist")
+        return balance
+
+    def recompute_loan_balance(self, loan: Loan) -> float:
+        self.flush()
+        monthly_totals = dict(self.connection.execute(
+            "SELECT month, SUM(amount) FROM payments WHERE loan_name = ? AND month >= ? GROUP BY month",
+            (loan.name, loan.month_created)
+        ))
+        return replay_loan_balance(loan, monthly_totals, self.month_counter)
+
+    def loan_balances(self) -> np.ndarray:
+        self.flush()
+        return np.array(
+            [balance for (balance,) in self.connection.execute("SELECT balance FROM loans ORDER BY id")],
+            dtype=np.float64,
+        )
+
+    def loan_growth_terms(self) -> Tuple[np.ndarray, np.ndarray]:
+        self.flush()
+        terms = np.array(
+            self.connection.execute("SELECT growth_rate, monthly_interest FROM loans ORDER BY id").fetchall(),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        return (terms[:, 0].copy(), terms[:, 1].copy())
+
+    def average_monthly_payments(self) -> np.ndarray:
+        self.flush()
+        loan_totals = dict(self.connection.execute("SELECT loan_name, SUM(amount) FROM payments GROUP BY loan_name"))
+        return np.array([
+            loan_totals.get(name, 0) / (self.month_counter - month_created + 1)
+            for (name, month_created) in self.connection.execute("SELECT name, month_created FROM loans ORDER BY id")
+        ], dtype=np.float64)
+
+    def iter_users(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[str]:
+        check_page(limit, offset)
+        self.flush()
+        return (
+            username
+            for (username,) in self.connection.execute(
+                "SELECT username FROM users ORDER BY id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            )
+        )
+
+    def iter_loan_balances(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[Tuple[Loan, float]]:
+        check_page(limit, offset)
+        self.flush()
+        return (
+            (loan_from_row(row), balance)
+            for (*row, balance) in self.connection.execute(
+                f"SELECT {loan_columns}, balance FROM loans ORDER BY id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            )
+        )
+
+    def iter_loans(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[Loan]:
+        check_page(limit, offset)
+        self.flush()
+        return map(loan_from_row, self.connection.execute(
+            f"SELECT {loan_columns} FROM loans ORDER BY id LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        ))
+
+    def iter_loan_payments(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[LoanPayment]:
+        check_page(limit, offset)
+        self.flush()
+        return (
+            LoanPayment(id=id, amount=amount, loan_name=loan_name, user_id=user_id, month_created=month)
+            for (id, loan_name, user_id, amount, month) in self.connection.execute(
+                "SELECT id, loan_name, user_id, amount, month FROM payments ORDER BY id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            )
+        )
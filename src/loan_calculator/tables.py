@@ -0,0 +1,153 @@
+"""
+Rendering of the riba listings.
+
+Rows are formatted a page at a time and every page goes out in one write, so
+listing a large book costs a handful of syscalls rather than one per row.
+Listings can be cut down with `limit` and `offset`, which the interpreter's
+`iter_*` methods apply before building any row (by slicing the payment
+ledger's columns, or with `LIMIT` and `OFFSET` in SQL). They come in three
+formats:
+
+- `table`: the REPL's `| S/N | ... |` layout, for people
+- `tsv`: a header line and tab-separated values
+- `jsonl`: one JSON object per row
+"""
+import json
+import sys
+from itertools import islice
+from typing import Any, Callable, Iterable, List, Optional, TextIO, Tuple
+
+formats = ("table", "tsv", "jsonl")
+page_size = 4096
+
+
+def format_text(text: str, width: int) -> str:
+    text_len = len(text)
+    if text_len > width:
+        return text[:width-3] + "..."
+    elif text_len < width:
+        return text + (" " * (width - text_len))
+    else:
+        return text
+
+def check_page(limit: Optional[int] = None, offset: int = 0):
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit and offset must not be negative")
+
+def paginate(items: Iterable, limit: Optional[int] = None, offset: int = 0) -> Iterable:
+    check_page(limit, offset)
+    if offset or limit is not None:
+        return islice(items, offset, None if limit is None else offset + limit)
+    return items
+
+
+class Column:
+    # Key of the column in JSON lines
+    key: str
+    # Heading in tables and TSV
+    name: str
+    width: int
+    # Format spec of numeric cells in tables, which are never truncated
+    spec: Optional[str]
+
+    def __init__(self, key: str, name: str, width: Optional[int] = None, spec: Optional[str] = None):
+        self.key = key
+        self.name = name
+        self.width = len(name) if width is None else width
+        self.spec = spec
+
+    def cell(self, value: Any) -> str:
+        if self.spec is not None:
+            return format(value, self.spec)
+        return format_text(str(value), self.width)
+
+
+class Table:
+    columns: Tuple[Column, ...]
+
+    def __init__(self, *columns: Column):
+        self.columns = columns
+
+    def header(self, format: str) -> Optional[str]:
+        if format == "table":
+            return "| " + " | ".join(format_text(column.name, column.width) for column in self.columns) + " |"
+        if format == "tsv":
+            return "\t".join(column.name for column in self.columns)
+        return None
+
+    def format_rows(self, rows: List[tuple], format: str, padding: str = "") -> str:
+        """One page of rows, each followed by a newline."""
+        if format == "table":
+            cells = [column.cell for column in self.columns]
+            lines = [
+                padding + "| " + " | ".join([cell(value) for (cell, value) in zip(cells, row)]) + " |"
+                for row in rows
+            ]
+        elif format == "tsv":
+            lines = [
+                "\t".join([str(value).replace("\t", " ").replace("\n", " ") for value in row])
+                for row in rows
+            ]
+        elif format == "jsonl":
+            keys = [column.key for column in self.columns]
+            lines = [json.dumps(dict(zip(keys, row))) for row in rows]
+        else:
+            raise ValueError(f"unknown output format {format!r}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def render(
+        self,
+        items: Iterable,
+        file: Optional[TextIO] = None,
+        format: str = "table",
+        limit: Optional[int] = None,
+        offset: int = 0,
+        row: Optional[Callable[[int, Any], tuple]] = None,
+        padding: str = "",
+    ) -> int:
+        """
+        Writes the `limit` items after the first `offset`, turning each into a
+        row with `row(index, item)` (by default, the item is the row), and
+        returns the number of rows written.
+        """
+        if format not in formats:
+            raise ValueError(f"unknown output format {format!r}")
+        file = sys.stdout if file is None else file
+
+        header = self.header(format)
+        if header is not None:
+            file.write((padding if format == "table" else "") + header + "\n")
+
+        items = iter(paginate(items, limit, offset))
+        index = offset
+        while True:
+            page = list(islice(items, page_size))
+            if row is not None:
+                page = [row(index + i, item) for (i, item) in enumerate(page)]
+            file.write(self.format_rows(page, format, padding))
+            index += len(page)
+            if len(page) < page_size:
+                break
+
+        file.flush()
+        return index - offset
+
+
+users_table = Table(
+    Column("id", "S/N", 3, "03d"),
+    Column("username", "Username"),
+)
+loans_table = Table(
+    Column("id", "S/N", 3, "03d"),
+    Column("loan_name", "Loan Name", 20),
+)
+payments_table = Table(
+    Column("id", "S/N", 3, "03d"),
+    Column("loan_name", "Loan Name"),
+    Column("amount", "Payment Amount", spec="14.2f"),
+)
+balances_table = Table(
+    Column("id", "S/N", 3, "03d"),
+    Column("loan_name", "Loan Name"),
+    Column("balance", "Loan Balance", spec="12.2f"),
+)
@@ -0,0 +1,150 @@
+"""
+Startup-time budget for the command-line entry points.
+
+Every entry point is started `--repeat` times under `python -X importtime`,
+which reports each import's own and cumulative time in microseconds on
+stderr. The import time of a run is the sum of the cumulative times of its
+top-level imports, leaving out the ones `python -c pass` makes too (`site`,
+`encodings` and the rest of interpreter startup), and the best run must fit
+the entry point's budget. No entry point may import any of the
+`heavy_modules` it doesn't allow, which commands import when they first need
+them.
+
+    python -m modelling_and_simulation_assignments.startup [--repeat N] [--scale X]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+heavy_modules = ("numpy", "scipy", "termplotlib", "matplotlib", "marimo")
+
+
+class EntryPoint:
+    # Interpreter arguments
+    arguments: List[str]
+    # Budget in milliseconds
+    budget: float
+    # Heavy modules it may import
+    allowed: Tuple[str, ...]
+    # Fed to its stdin
+    input: str
+
+    def __init__(self, arguments: List[str], budget: float, allowed: Tuple[str, ...] = (), input: str = ""):
+        self.arguments = arguments
+        self.budget = budget
+        self.allowed = allowed
+        self.input = input
+
+
+entry_points: Dict[str, EntryPoint] = {
+    "modelling-and-simulation-assignments": EntryPoint(["-m", "modelling_and_simulation_assignments"], 10.0),
+    "loan-calculator --help": EntryPoint(["-m", "loan_calculator", "--help"], 30.0),
+    "queuing-models --help": EntryPoint(["-m", "queuing_models", "--help"], 30.0),
+    "import loan_calculator": EntryPoint(["-c", "import loan_calculator"], 30.0),
+    "import queuing_models": EntryPoint(["-c", "import queuing_models"], 10.0),
+    # The REPL builds an `Interpreter`, whose ledger, engine and forecaster need NumPy
+    "loan-calculator (REPL start)": EntryPoint(["-m", "loan_calculator"], 150.0, allowed=("numpy",), input="q\n"),
+}
+
+
+class ImportReport:
+    # (module, cumulative microseconds) of the top-level imports
+    top_level: List[Tuple[str, int]]
+    modules: List[str]
+
+    def __init__(self, top_level: List[Tuple[str, int]], modules: List[str]):
+        self.top_level = top_level
+        self.modules = modules
+
+    def milliseconds(self) -> float:
+        return sum(cumulative for (_, cumulative) in self.top_level) / 1000
+
+    def without(self, startup: "ImportReport") -> "ImportReport":
+        """This report without the top-level imports `startup` made too."""
+        startup_modules = {module for (module, _) in startup.top_level}
+        return ImportReport(
+            [(module, cumulative) for (module, cumulative) in self.top_level if module not in startup_modules],
+            self.modules,
+        )
+
+    def heavy_imports(self, allowed: Tuple[str, ...] = ()) -> List[str]:
+        return sorted({module.split(".")[0] for module in self.modules} & (set(heavy_modules) - set(allowed)))
+
+    def slowest(self, count: int = 5) -> List[Tuple[str, int]]:
+        return sorted(self.top_level, key=lambda item: -item[1])[:count]
+
+
+def parse_importtime(stderr: str) -> ImportReport:
+    top_level = []
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        (_, cumulative, package) = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            # The column headings
+            continue
+        module = package.strip()
+        modules.append(module)
+        # Nested imports are indented under the import that caused them
+        if not package.startswith("  "):
+            top_level.append((module, int(cumulative)))
+    return ImportReport(top_level, modules)
+
+def measure(arguments: List[str], repeat: int = 5, input: str = "", startup: Optional[ImportReport] = None) -> ImportReport:
+    """
+    The fastest of `repeat` runs of the interpreter with `arguments`, without
+    the imports of `startup` if given.
+    """
+    source_root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (source_root, env.get("PYTHONPATH"))))
+
+    reports = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *arguments],
+            input=input,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+        report = parse_importtime(completed.stderr)
+        reports.append(report if startup is None else report.without(startup))
+    return min(reports, key=ImportReport.milliseconds)
+
+def check_budgets(repeat: int = 5, scale: float = 1.0, names: Optional[List[str]] = None) -> bool:
+    within_budget = True
+    startup = measure(["-c", "pass"], repeat=1)
+    for (name, entry_point) in entry_points.items():
+        if names and name not in names:
+            continue
+        report = measure(entry_point.arguments, repeat, entry_point.input, startup)
+        budget = entry_point.budget * scale
+        heavy = report.heavy_imports(entry_point.allowed)
+        passed = report.milliseconds() <= budget and not heavy
+        within_budget &= passed
+
+        print(f"{'ok' if passed else 'FAIL':4} {name:40} {report.milliseconds():7.1f} ms (budget {budget:.0f} ms)")
+        if heavy:
+            print(f"     imports {', '.join(heavy)}")
+        if not passed:
+            for (module, cumulative) in report.slowest():
+                print(f"     {cumulative / 1000:7.1f} ms  {module}")
+    return within_budget
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of every entry point against its budget.")
+    parser.add_argument("names", nargs="*", metavar="ENTRY_POINT", help="only check these entry points")
+    parser.add_argument("--repeat", metavar="N", type=int, default=5, help="runs per entry point; the fastest counts (default: %(default)s)")
+    parser.add_argument("--scale", metavar="X", type=float, default=1.0, help="multiply every budget by X, e.g. on slow machines")
+    args = parser.parse_args(argv)
+    return 0 if check_budgets(args.repeat, args.scale, args.names) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,80 @@
-class QueueModel:
-    arrival_rate: int
-    departure_rate: int
+"""
+Queuing models: closed forms for M/M/1 (`single_server`), M/M/c and M/M/c/K
+(`multiserver`), simulations, replications, networks and transients.
 
-    def __init__(arrival_rate: int, departure_rate: int) -> QueueModel:
-        self.arrival_rate = arrival_rate
-        self.departure_rate = departure_rate 
+Everything is importable from the package itself, but each name is only
+imported from its module when first used, so `import queuing_models` doesn't
+load NumPy or SciPy.
+"""
+import argparse
+import importlib
+from typing import List, Optional
 
-    def rho(self) -> float:
-        """ρ = λ / μ"""
-        return self.arrival_rate / self.departure_rate
+_exports = {
+    "single_server": (
+        "QueueMetrics",
+        "QueueModel",
+        "prob_of_at_most_n_on_queue",
+        "prob_of_more_than_n_on_queue",
+        "prob_of_n_on_queue",
+        "rho",
+    ),
+    "multiserver": ("FiniteQueueModel", "MultiServerQueueModel", "erlang_b", "erlang_c"),
+    "simulation": (
+        "DeterministicProcess",
+        "DistributionProcess",
+        "ExponentialProcess",
+        "QueueSimulation",
+        "SimulationResult",
+        "simulate_mmc",
+    ),
+    "lindley": ("LindleyResult", "LindleySimulation", "lindley_waits", "simulate_mm1_waits"),
+    "replication": ("ReplicationSummary", "run_replications"),
+    "cache": ("QueueTable", "queue_table"),
+    "network": ("JacksonNetwork", "tandem_network"),
+    "transient": ("TransientSolution", "birth_death_generator", "time_to_steady_state", "transient_distribution"),
+}
+_modules = {name: module for (module, names) in _exports.items() for name in names}
 
-    def probability_of_n_on_queue(n: int) -> float:
-        return 
+__all__ = sorted(_modules) + ["main"]
 
-    def probability_of_n_on_queue
\ No newline at end of file
+
+def __getattr__(name: str):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="queuing-models",
+        description="Steady-state measures of an M/M/c or M/M/c/K queue.",
+    )
+    parser.add_argument("arrival_rate", type=float, help="λ, customers arriving per unit time")
+    parser.add_argument("departure_rate", type=float, help="μ, customers each server serves per unit time")
+    parser.add_argument("--servers", metavar="C", type=int, default=1, help="number of servers (default: %(default)s)")
+    parser.add_argument("--capacity", metavar="K", type=int, help="most customers in the system (default: unlimited)")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    if args.capacity is not None:
+        from .multiserver import FiniteQueueModel
+        model = FiniteQueueModel(args.arrival_rate, args.departure_rate, args.capacity, args.servers)
+    elif args.servers == 1:
+        from .single_server import QueueModel
+        model = QueueModel(args.arrival_rate, args.departure_rate)
+    else:
+        from .multiserver import MultiServerQueueModel
+        model = MultiServerQueueModel(args.arrival_rate, args.departure_rate, args.servers)
+
+    for (measure, value) in model.metrics().as_dict().items():
+        print(f"{measure:>3} = {float(value):.6g}")
+    return 0
@@ -0,0 +1,77 @@
+"""
+Precomputed M/M/1 tables for interactive use.
+
+`queue_table(λ, μ)` builds p(n), p(0..n) and p(n+1..) for every n up to `max_n` once,
+and keeps the most recently used tables in a bounded LRU cache, so scrubbing
+through the notebook controls only ever indexes into arrays.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .single_server import QueueMetrics, QueueModel
+
+default_max_n = 1024
+cache_size = 256
+
+
+class QueueTable:
+    arrival_rate: float
+    departure_rate: float
+    rho: float
+    # distribution[n] = p(n), cumulative[n] = p(0..n) and tail[n] = p(n+1..), for n = 0..max_n.
+    # The tail is kept from its closed form, as 1 - p(0..n) rounds small tails to 0
+    distribution: np.ndarray
+    cumulative: np.ndarray
+    tail: np.ndarray
+    metrics: QueueMetrics
+
+    def __init__(self, arrival_rate: float, departure_rate: float, max_n: int):
+        model = QueueModel(arrival_rate, departure_rate)
+        n = np.arange(max_n + 1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.arrival_rate = arrival_rate
+            self.departure_rate = departure_rate
+            self.rho = float(model.rho())
+            self.distribution = model.probability_of_n_on_queue(n)
+            self.cumulative = model.probability_of_at_most_n_on_queue(n)
+            self.tail = model.probability_of_more_than_n_on_queue(n)
+            self.metrics = QueueMetrics(*(float(value) for value in model.metrics().as_dict().values()))
+
+        for table in (self.distribution, self.cumulative, self.tail):
+            table.flags.writeable = False
+        self._model = model
+
+    def probability_of_n_on_queue(self, n: int) -> float:
+        """p(n)"""
+        if 0 <= n < len(self.distribution):
+            return float(self.distribution[n])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(self._model.probability_of_n_on_queue(n))
+
+    def probability_of_at_most_n_on_queue(self, n: int) -> float:
+        """p(0..n)"""
+        if 0 <= n < len(self.cumulative):
+            return float(self.cumulative[n])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(self._model.probability_of_at_most_n_on_queue(n))
+
+    def probability_of_more_than_n_on_queue(self, n: int) -> float:
+        """p(n+1..)"""
+        if 0 <= n < len(self.tail):
+            return float(self.tail[n])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(self._model.probability_of_more_than_n_on_queue(n))
+
+
+@lru_cache(maxsize=cache_size)
+def _queue_table(arrival_rate: float, departure_rate: float, max_n: int) -> QueueTable:
+    return QueueTable(arrival_rate, departure_rate, max_n)
+
+def queue_table(arrival_rate: float, departure_rate: float, max_n: int = default_max_n) -> QueueTable:
+    """The (cached) table of the M/M/1 queue with rates λ and μ."""
+    return _queue_table(float(arrival_rate), float(departure_rate), int(max_n))
+
+cache_info = _queue_table.cache_info
+cache_clear = _queue_table.cache_clear
@@ -0,0 +1,141 @@
+"""
+Waiting times of single-server FIFO (G/G/1) queues by the Lindley recursion
+
+    W(i) = max(0, W(i-1) + S(i-1) - A(i))
+
+where A(i) is the time between the arrivals of customers i-1 and i, and S(i)
+is the service time of customer i. Writing C for the cumulative sum of the
+increments S(i-1) - A(i), the recursion unrolls to
+
+    W(i) = C(i) - min(0, min C(0..i))
+
+so a whole chunk of customers is computed with a cumsum and a running
+minimum. Only the work left behind by the last customer of a chunk is
+carried into the next, and every chunk is folded into streaming statistics
+(see `stats`), so memory use does not grow with the number of customers.
+"""
+import time
+
+import numpy as np
+
+from .single_server import QueueMetrics
+from .simulation import ExponentialProcess, Process
+from .stats import QuantileSketch, RunningStats
+
+
+def lindley_waits(interarrival_times: np.ndarray, service_times: np.ndarray, backlog: float = 0.0) -> np.ndarray:
+    """
+    The waiting times of consecutive customers, where `backlog` is the work
+    (wait plus service) brought by the customer before the first one.
+    """
+    increments = np.empty(len(interarrival_times))
+    if len(increments) == 0:
+        return increments
+    increments[0] = backlog - interarrival_times[0]
+    np.subtract(service_times[:-1], interarrival_times[1:], out=increments[1:])
+
+    cumulative = np.cumsum(increments)
+    running_minimum = np.minimum.accumulate(cumulative)
+    np.minimum(running_minimum, 0, out=running_minimum)
+    return np.subtract(cumulative, running_minimum, out=cumulative)
+
+
+class LindleyResult:
+    # Sum of the inter-arrival and service times of the measured customers
+    elapsed_time: float
+    busy_time: float
+    # Number of customers who had to wait at all
+    waited: int
+    waits: RunningStats
+    sojourns: RunningStats
+    wait_quantiles: QuantileSketch
+    wall_seconds: float
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.elapsed_time = 0.0
+        self.busy_time = 0.0
+        self.waited = 0
+        self.waits = RunningStats()
+        self.sojourns = RunningStats()
+        self.wait_quantiles = QuantileSketch(relative_accuracy)
+        self.wall_seconds = 0.0
+
+    @property
+    def customers(self) -> int:
+        return self.waits.count
+
+    def add_chunk(self, interarrival_times: np.ndarray, service_times: np.ndarray, waits: np.ndarray):
+        if len(waits) == 0:
+            return
+        self.waits.add_batch(waits)
+        self.sojourns.add_batch(waits + service_times)
+        self.wait_quantiles.add_batch(waits)
+        self.elapsed_time += float(interarrival_times.sum())
+        self.busy_time += float(service_times.sum())
+        self.waited += int(np.count_nonzero(waits))
+
+    def probability_of_waiting(self) -> float:
+        return self.waited / self.customers
+
+    def customers_per_second(self) -> float:
+        return self.customers / self.wall_seconds if self.wall_seconds > 0 else float("inf")
+
+    def metrics(self) -> QueueMetrics:
+        """L and Lq follow from W and Wq by Little's law, L = λ W."""
+        arrival_rate = self.customers / self.elapsed_time
+        return QueueMetrics(
+            rho=self.busy_time / self.elapsed_time,
+            L=arrival_rate * self.sojourns.mean,
+            Lq=arrival_rate * self.waits.mean,
+            W=self.sojourns.mean,
+            Wq=self.waits.mean,
+        )
+
+
+class LindleySimulation:
+    arrivals: Process
+    services: Process
+    seed: np.random.SeedSequence
+
+    def __init__(self, arrivals: Process, services: Process, seed=None):
+        self.arrivals = arrivals
+        self.services = services
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    def run(self, customers: int, warmup: int = 0, chunk_size: int = 1 << 20) -> LindleyResult:
+        """
+        Simulates `warmup + customers` customers, starting from an empty
+        system, and summarises the last `customers` of them.
+        """
+        (arrival_seed, service_seed) = self.seed.spawn(2)
+        arrival_rng = np.random.default_rng(arrival_seed)
+        service_rng = np.random.default_rng(service_seed)
+
+        result = LindleyResult()
+        backlog = 0.0
+        remaining = warmup + customers
+        start = time.perf_counter()
+
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            interarrival_times = self.arrivals.draw(arrival_rng, size)
+            service_times = self.services.draw(service_rng, size)
+            waits = lindley_waits(interarrival_times, service_times, backlog)
+            backlog = float(waits[-1] + service_times[-1])
+
+            skip = min(warmup, size)
+            warmup -= skip
+            result.add_chunk(interarrival_times[skip:], service_times[skip:], waits[skip:])
+            remaining -= size
+
+        result.wall_seconds = time.perf_counter() - start
+        return result
+
+
+def simulate_mm1_waits(arrival_rate: float, departure_rate: float, customers: int = 10**7, warmup: int = 0, seed=None) -> LindleyResult:
+    """Simulates the M/M/1 queue described by `QueueModel`."""
+    return LindleySimulation(
+        ExponentialProcess(arrival_rate),
+        ExponentialProcess(departure_rate),
+        seed=seed,
+    ).run(customers, warmup=warmup)
@@ -0,0 +1,268 @@
+"""
+Multi-server (M/M/c) and finite-capacity (M/M/1/K, M/M/c/K) queues.
+
+Like `QueueModel`, every model broadcasts array-valued parameters, including
+the number of servers, so a whole range of server counts can be sized at once.
+Factorials never appear directly: the Erlang formulas and the state
+probabilities are computed in log space, with sums over the server counts as
+a `logsumexp` over a masked axis.
+"""
+import numpy as np
+from scipy.special import gammaln, logsumexp, xlogy
+
+from .single_server import QueueMetrics
+
+
+def erlang_b(servers, offered_load) -> np.ndarray:
+    """
+    B(c, a), the probability that an arriving customer finds all `c` servers
+    busy in a loss system with offered load a = λ / μ:
+
+        log B = c log a - log c! - log Σ_{k≤c} a^k / k!
+    """
+    (servers, offered_load) = np.broadcast_arrays(
+        np.asarray(servers, dtype=np.int64),
+        np.asarray(offered_load, dtype=np.float64),
+    )
+    k = np.arange(int(servers.max(initial=0)) + 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_terms = np.where(
+            k <= servers[..., None],
+            xlogy(k, offered_load[..., None]) - gammaln(k + 1),
+            -np.inf,
+        )
+        log_blocking = xlogy(servers, offered_load) - gammaln(servers + 1) - logsumexp(log_terms, axis=-1)
+    return np.exp(log_blocking)
+
+def erlang_c(servers, offered_load) -> np.ndarray:
+    """
+    C(c, a) = B / (1 - ρ (1 - B)), the probability that an arriving customer
+    has to wait, where ρ = a / c. NaN when ρ ≥ 1.
+    """
+    servers = np.asarray(servers, dtype=np.int64)
+    offered_load = np.asarray(offered_load, dtype=np.float64)
+    blocking = erlang_b(servers, offered_load)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = offered_load / servers
+        waiting = blocking / (1 - rho * (1 - blocking))
+    return np.where(rho < 1, waiting, np.nan)
+
+
+class MultiServerQueueModel:
+    """
+    An M/M/c queue. `rho` is the utilisation of each server, λ / (c μ), and
+    the measures of unstable scenarios (ρ ≥ 1) are NaN.
+    """
+    arrival_rate: np.ndarray
+    departure_rate: np.ndarray
+    servers: np.ndarray
+
+    def __init__(self, arrival_rate, departure_rate, servers):
+        (self.arrival_rate, self.departure_rate, self.servers) = np.broadcast_arrays(
+            np.asarray(arrival_rate, dtype=np.float64),
+            np.asarray(departure_rate, dtype=np.float64),
+            np.asarray(servers, dtype=np.int64),
+        )
+
+    def offered_load(self) -> np.ndarray:
+        """a = λ / μ"""
+        return self.arrival_rate / self.departure_rate
+
+    def rho(self) -> np.ndarray:
+        """ρ = λ / (c μ)"""
+        return self.offered_load() / self.servers
+
+    def is_stable(self) -> np.ndarray:
+        """ρ < 1"""
+        return self.rho() < 1
+
+    def probability_of_waiting(self) -> np.ndarray:
+        """C(c, a)"""
+        return erlang_c(self.servers, self.offered_load())
+
+    def Lq(self) -> np.ndarray:
+        """Lq = C ρ / (1 - ρ)"""
+        rho = self.rho()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.probability_of_waiting() * rho / (1 - rho)
+
+    def Wq(self) -> np.ndarray:
+        """Wq = Lq / λ = C / (c μ - λ)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.probability_of_waiting() / (self.servers * self.departure_rate - self.arrival_rate)
+
+    def W(self) -> np.ndarray:
+        """W = Wq + 1 / μ"""
+        return self.Wq() + 1 / self.departure_rate
+
+    def L(self) -> np.ndarray:
+        """L = Lq + λ / μ"""
+        return self.Lq() + self.offered_load()
+
+    def log_probability_of_empty(self) -> np.ndarray:
+        """
+        log p(0) = -log(Σ_{n<c} a^n / n! + a^c / (c! (1 - ρ))), summed in log
+        space so that it doesn't underflow when most servers are idle
+        """
+        n = np.arange(int(self.servers.max(initial=0)))
+        servers = self.servers[..., None]
+        offered_load = self.offered_load()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_idle_terms = np.where(
+                n < servers,
+                xlogy(n, offered_load[..., None]) - gammaln(n + 1),
+                -np.inf,
+            )
+            log_queue_term = xlogy(self.servers, offered_load) - gammaln(self.servers + 1) - np.log1p(-self.rho())
+            log_terms = np.concatenate([log_idle_terms, log_queue_term[..., None]], axis=-1)
+            return -logsumexp(log_terms, axis=-1)
+
+    def probability_of_n_on_queue(self, n) -> np.ndarray:
+        """
+        p(n) = p(0) a^n / n!              for n < c
+        p(n) = p(0) a^c / c! ρ^(n-c)      for n ≥ c
+        """
+        n = np.asarray(n, dtype=np.int64)
+        servers = self.servers
+        offered_load = self.offered_load()
+        rho = self.rho()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_p_0 = self.log_probability_of_empty()
+            log_p_n = np.where(
+                n < servers,
+                log_p_0 + xlogy(n, offered_load) - gammaln(n + 1),
+                log_p_0 + xlogy(servers, offered_load) - gammaln(servers + 1) + xlogy(n - servers, rho),
+            )
+            p_n = np.exp(log_p_n)
+
+        # With no arrivals the system is always empty
+        p_n = np.where(offered_load == 0, (n == 0).astype(np.float64), p_n)
+        return np.where(self.is_stable(), p_n, np.nan)
+
+    def state_distribution(self, max_n: int) -> np.ndarray:
+        """p(0), ..., p(max_n) for every scenario, along a new last axis."""
+        model = MultiServerQueueModel(
+            self.arrival_rate[..., None],
+            self.departure_rate[..., None],
+            self.servers[..., None],
+        )
+        return model.probability_of_n_on_queue(np.arange(max_n + 1))
+
+    def metrics(self) -> QueueMetrics:
+        return QueueMetrics(
+            rho=self.rho(),
+            L=self.L(),
+            Lq=self.Lq(),
+            W=self.W(),
+            Wq=self.Wq(),
+        )
+
+
+class FiniteQueueModel:
+    """
+    An M/M/c/K queue: `servers` servers and room for at most `capacity`
+    customers in the system (K ≥ c), so arrivals that find it full are lost.
+    With `servers=1` this is the M/M/1/K queue. Finite queues are always
+    stable; `rho` is the utilisation of each server by the customers that
+    are admitted.
+    """
+    arrival_rate: np.ndarray
+    departure_rate: np.ndarray
+    servers: np.ndarray
+    capacity: np.ndarray
+
+    def __init__(self, arrival_rate, departure_rate, capacity, servers=1):
+        (self.arrival_rate, self.departure_rate, self.capacity, self.servers) = np.broadcast_arrays(
+            np.asarray(arrival_rate, dtype=np.float64),
+            np.asarray(departure_rate, dtype=np.float64),
+            np.asarray(capacity, dtype=np.int64),
+            np.asarray(servers, dtype=np.int64),
+        )
+        if np.any(self.capacity < self.servers):
+            raise ValueError("capacity must be at least the number of servers")
+
+    def offered_load(self) -> np.ndarray:
+        """a = λ / μ"""
+        return self.arrival_rate / self.departure_rate
+
+    def state_distribution(self, max_n=None) -> np.ndarray:
+        """
+        p(0), ..., p(max_n) for every scenario, along a new last axis, where
+        max_n defaults to the largest capacity. Unnormalised,
+
+            log p(n) = n log a - log n!                         for n ≤ c
+            log p(n) = c log a - log c! + (n - c) log(a / c)    for n > c
+        """
+        if max_n is None:
+            max_n = int(self.capacity.max(initial=0))
+
+        n = np.arange(max_n + 1)
+        servers = self.servers[..., None]
+        capacity = self.capacity[..., None]
+        offered_load = self.offered_load()[..., None]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_weights = np.where(
+                n <= servers,
+                xlogy(n, offered_load) - gammaln(n + 1),
+                xlogy(servers, offered_load) - gammaln(servers + 1) + xlogy(n - servers, offered_load / servers),
+            )
+        log_weights = np.where(n <= capacity, log_weights, -np.inf)
+        return np.exp(log_weights - logsumexp(log_weights, axis=-1, keepdims=True))
+
+    def probability_of_n_on_queue(self, n) -> np.ndarray:
+        distribution = self.state_distribution()
+        (n, capacity) = np.broadcast_arrays(np.asarray(n, dtype=np.int64), self.capacity)
+        index = np.clip(n, 0, distribution.shape[-1] - 1)
+        p_n = np.take_along_axis(
+            np.broadcast_to(distribution, n.shape + distribution.shape[-1:]),
+            index[..., None],
+            axis=-1,
+        )[..., 0]
+        return np.where((n >= 0) & (n <= capacity), p_n, 0)
+
+    def probability_of_blocking(self) -> np.ndarray:
+        """p(K), the fraction of arrivals that are turned away"""
+        return self.probability_of_n_on_queue(self.capacity)
+
+    def effective_arrival_rate(self) -> np.ndarray:
+        """λ_eff = λ (1 - p(K))"""
+        return self.arrival_rate * (1 - self.probability_of_blocking())
+
+    def rho(self) -> np.ndarray:
+        """ρ = λ_eff / (c μ)"""
+        return self.effective_arrival_rate() / (self.servers * self.departure_rate)
+
+    def L(self) -> np.ndarray:
+        """L = Σ n p(n)"""
+        distribution = self.state_distribution()
+        return (distribution * np.arange(distribution.shape[-1])).sum(axis=-1)
+
+    def Lq(self) -> np.ndarray:
+        """Lq = Σ (n - c) p(n) over n > c"""
+        distribution = self.state_distribution()
+        waiting = np.maximum(np.arange(distribution.shape[-1]) - self.servers[..., None], 0)
+        return (distribution * waiting).sum(axis=-1)
+
+    def W(self) -> np.ndarray:
+        """W = L / λ_eff"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.L() / self.effective_arrival_rate()
+
+    def Wq(self) -> np.ndarray:
+        """Wq = Lq / λ_eff"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.Lq() / self.effective_arrival_rate()
+
+    def metrics(self) -> QueueMetrics:
+        return QueueMetrics(
+            rho=self.rho(),
+            L=self.L(),
+            Lq=self.Lq(),
+            W=self.W(),
+            Wq=self.Wq(),
+        )
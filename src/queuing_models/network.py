@@ -0,0 +1,119 @@
+"""
+Open Jackson networks: M/M/c stations joined by probabilistic routing.
+
+A customer leaving station i goes to station j with probability R[i, j] and
+leaves the network with probability 1 - Σ_j R[i, j]. The total arrival rate
+λ of every station solves the traffic equations
+
+    λ = γ + Rᵀ λ,   i.e.   (I - Rᵀ) λ = γ
+
+where γ holds the external arrival rates. The routing matrix is kept in
+sparse form and the equations are solved iteratively (BiCGSTAB), falling
+back to a sparse LU factorisation if that fails to converge, so networks
+with thousands of stations never need a dense matrix. Each station
+then behaves as an independent M/M/c queue with arrival rate λ_i.
+"""
+import warnings
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import MatrixRankWarning, bicgstab, spsolve
+
+from .single_server import QueueMetrics
+from .multiserver import MultiServerQueueModel
+
+
+class JacksonNetwork:
+    # routing[i, j] is the probability of going from station i to station j
+    routing: sparse.csr_array
+    external_arrival_rates: np.ndarray
+    departure_rates: np.ndarray
+    servers: np.ndarray
+
+    def __init__(self, routing, external_arrival_rates, departure_rates, servers=1):
+        self.routing = sparse.csr_array(routing, dtype=np.float64)
+        stations = self.routing.shape[0]
+        if self.routing.shape != (stations, stations):
+            raise ValueError("routing matrix must be square")
+
+        self.external_arrival_rates = np.broadcast_to(np.asarray(external_arrival_rates, dtype=np.float64), (stations,))
+        self.departure_rates = np.broadcast_to(np.asarray(departure_rates, dtype=np.float64), (stations,))
+        self.servers = np.broadcast_to(np.asarray(servers, dtype=np.int64), (stations,))
+
+        if self.routing.nnz and self.routing.data.min() < 0:
+            raise ValueError("routing probabilities must not be negative")
+        if np.any(self.routing.sum(axis=1) > 1 + 1e-12):
+            raise ValueError("routing probabilities out of a station must sum to at most 1")
+
+        self._arrival_rates = None
+
+    def __len__(self) -> int:
+        return self.routing.shape[0]
+
+    def arrival_rates(self) -> np.ndarray:
+        """λ = (I - Rᵀ)⁻¹ γ"""
+        if self._arrival_rates is None:
+            traffic = (sparse.identity(len(self), format="csc") - self.routing.T.tocsc()).tocsc()
+            (arrival_rates, info) = bicgstab(traffic, self.external_arrival_rates, rtol=1e-12, atol=0)
+
+            # Sparse LU fills in badly on randomly connected networks, so it is only the fallback
+            if info != 0:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error", MatrixRankWarning)
+                    try:
+                        arrival_rates = np.atleast_1d(spsolve(traffic, self.external_arrival_rates))
+                    except MatrixRankWarning:
+                        arrival_rates = np.full(len(self), np.nan)
+            if not np.all(np.isfinite(arrival_rates)):
+                raise ValueError("traffic equations are singular: some customers can never leave the network")
+            self._arrival_rates = arrival_rates
+        return self._arrival_rates
+
+    def stations(self) -> MultiServerQueueModel:
+        """Every station as an M/M/c queue fed at its total arrival rate."""
+        return MultiServerQueueModel(self.arrival_rates(), self.departure_rates, self.servers)
+
+    def rho(self) -> np.ndarray:
+        """ρ_i = λ_i / (c_i μ_i)"""
+        return self.stations().rho()
+
+    def is_stable(self) -> bool:
+        """ρ_i < 1 at every station"""
+        return bool(np.all(self.stations().is_stable()))
+
+    def visit_ratios(self) -> np.ndarray:
+        """v_i = λ_i / Σ γ, the mean number of visits a customer makes to station i"""
+        return self.arrival_rates() / self.external_arrival_rates.sum()
+
+    def station_metrics(self) -> QueueMetrics:
+        """The measures of every station, one entry per station."""
+        return self.stations().metrics()
+
+    def metrics(self) -> QueueMetrics:
+        """
+        The measures of the network as a whole: L and Lq are summed over the
+        stations, W and Wq are the mean times a customer spends in the
+        network (by Little's law, L / Σ γ), and rho is the utilisation of the
+        busiest station.
+        """
+        stations = self.station_metrics()
+        throughput = self.external_arrival_rates.sum()
+        L = stations.L.sum()
+        Lq = stations.Lq.sum()
+        return QueueMetrics(
+            rho=stations.rho.max(initial=0),
+            L=L,
+            Lq=Lq,
+            W=L / throughput,
+            Wq=Lq / throughput,
+        )
+
+
+def tandem_network(departure_rates, arrival_rate: float, servers=1) -> JacksonNetwork:
+    """Stations in series: every customer visits each station once, in order."""
+    departure_rates = np.asarray(departure_rates, dtype=np.float64)
+    stations = len(departure_rates)
+    routing = sparse.diags_array(np.ones(stations - 1), offsets=1, shape=(stations, stations))
+    external_arrival_rates = np.zeros(stations)
+    external_arrival_rates[0] = arrival_rate
+    return JacksonNetwork(routing, external_arrival_rates, departure_rates, servers)
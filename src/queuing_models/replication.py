@@ -0,0 +1,130 @@
+"""
+Independent replications of a queue simulation, with confidence intervals.
+
+Every replication runs a copy of the simulation seeded with its own child of
+one `SeedSequence`, so replication i always draws the same variates no matter
+how many workers there are or which wave it ran in. Replications run in
+waves spread over a process pool; after each wave the Student-t confidence
+intervals of the replication means are recomputed, and the run stops as soon
+as every target measure is within the requested relative precision.
+
+    summary = run_replications(QueueSimulation(ExponentialProcess(2), ExponentialProcess(3)),
+                               relative_precision=0.01, customers=10**5, warmup=100)
+    summary.mean().W, summary.interval("W")
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import stats
+
+from .single_server import QueueMetrics
+
+measures = ("rho", "L", "Lq", "W", "Wq")
+
+
+def run_replication(simulation, seed: np.random.SeedSequence, run_options: dict) -> np.ndarray:
+    """Runs one replication and returns its measures in the order of `measures`."""
+    simulation = copy.copy(simulation)
+    simulation.seed = seed
+    metrics = simulation.run(**run_options).metrics()
+    return np.array([getattr(metrics, measure) for measure in measures], dtype=np.float64)
+
+
+class ReplicationSummary:
+    # samples[i, j] is measures[j] in replication i
+    samples: np.ndarray
+    confidence: float
+
+    def __init__(self, samples: np.ndarray, confidence: float):
+        self.samples = samples
+        self.confidence = confidence
+
+    @property
+    def replications(self) -> int:
+        return len(self.samples)
+
+    def _means(self) -> np.ndarray:
+        return self.samples.mean(axis=0)
+
+    def _half_widths(self) -> np.ndarray:
+        n = self.replications
+        if n < 2:
+            return np.full(len(measures), np.inf)
+        standard_error = self.samples.std(axis=0, ddof=1) / np.sqrt(n)
+        return stats.t.ppf((1 + self.confidence) / 2, n - 1) * standard_error
+
+    def mean(self) -> QueueMetrics:
+        return QueueMetrics(*self._means())
+
+    def half_width(self) -> QueueMetrics:
+        return QueueMetrics(*self._half_widths())
+
+    def relative_precision(self) -> QueueMetrics:
+        """half width / |mean|"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return QueueMetrics(*(self._half_widths() / np.abs(self._means())))
+
+    def interval(self, measure: str) -> Tuple[float, float]:
+        index = measures.index(measure)
+        (mean, half_width) = (self._means()[index], self._half_widths()[index])
+        return (mean - half_width, mean + half_width)
+
+
+def run_replications(
+    simulation,
+    relative_precision: Optional[float] = None,
+    target_measures: Sequence[str] = ("W",),
+    min_replications: int = 10,
+    max_replications: int = 1000,
+    wave_size: Optional[int] = None,
+    confidence: float = 0.95,
+    seed=None,
+    workers: Optional[int] = None,
+    **run_options,
+) -> ReplicationSummary:
+    """
+    Runs replications of `simulation` (a `QueueSimulation` or
+    `LindleySimulation`), passing `run_options` to its `run` method.
+
+    Without a `relative_precision`, exactly `max_replications` are run.
+    Otherwise `min_replications` are run first and then waves of `wave_size`
+    (by default `min_replications`) until the target measures are precise
+    enough or `max_replications` is reached. `workers=1` runs every
+    replication in this process, which also allows processes that can't be
+    pickled, such as a `DistributionProcess` with a lambda sampler.
+    """
+    for measure in target_measures:
+        if measure not in measures:
+            raise ValueError(f"unknown measure {measure!r}")
+    if min_replications < 2:
+        raise ValueError("at least two replications are needed for a confidence interval")
+
+    seeds = np.random.SeedSequence(seed).spawn(max_replications)
+    targets = [measures.index(measure) for measure in target_measures]
+    wave_size = wave_size or min_replications
+    first_wave = max_replications if relative_precision is None else min(min_replications, max_replications)
+
+    samples = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        while len(samples) < max_replications:
+            size = first_wave if not samples else wave_size
+            wave = seeds[len(samples):len(samples) + size]
+
+            if executor is None:
+                samples += [run_replication(simulation, child, run_options) for child in wave]
+            else:
+                futures = [executor.submit(run_replication, simulation, child, run_options) for child in wave]
+                samples += [future.result() for future in futures]
+
+            if relative_precision is not None:
+                precision = ReplicationSummary(np.array(samples), confidence).relative_precision()
+                if all(getattr(precision, measures[index]) <= relative_precision for index in targets):
+                    break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return ReplicationSummary(np.array(samples), confidence)
@@ -0,0 +1,128 @@
+"""
+Closed-form results for the single-server, infinite-queue (M/M/1) model.
+
+Every function accepts scalars or NumPy arrays and broadcasts over them, so a
+whole grid of (λ, μ, n) combinations can be evaluated in one call, e.g.
+
+    prob_of_at_most_n_on_queue(n[None, None, :], rho(λ[:, None, None], μ[None, :, None]))
+"""
+import numpy as np
+
+
+def rho(arrival_rate, departure_rate):
+    """ρ = λ / μ"""
+    return np.divide(arrival_rate, departure_rate, dtype=np.float64)
+
+def prob_of_n_on_queue(n, rho):
+    """p(n) = ρ^n (1 - ρ)"""
+    rho = np.asarray(rho, dtype=np.float64)
+    return rho**n * (1 - rho)
+
+def prob_of_at_most_n_on_queue(n, rho):
+    """p(0..n) = 1 - ρ^(n+1)"""
+    return 1 - np.asarray(rho, dtype=np.float64)**np.add(n, 1)
+
+def prob_of_more_than_n_on_queue(n, rho):
+    """p(n+1..) = 1 - p(0..n) = ρ^(n+1)"""
+    return np.asarray(rho, dtype=np.float64)**np.add(n, 1)
+
+
+class QueueMetrics:
+    """The steady-state performance measures of a queue (or grid of queues)."""
+    rho: np.ndarray
+    L: np.ndarray
+    Lq: np.ndarray
+    W: np.ndarray
+    Wq: np.ndarray
+
+    def __init__(self, rho, L, Lq, W, Wq):
+        self.rho = rho
+        self.L = L
+        self.Lq = Lq
+        self.W = W
+        self.Wq = Wq
+
+    def as_dict(self) -> dict:
+        return {"rho": self.rho, "L": self.L, "Lq": self.Lq, "W": self.W, "Wq": self.Wq}
+
+    def __repr__(self) -> str:
+        return f"QueueMetrics(rho={self.rho}, L={self.L}, Lq={self.Lq}, W={self.W}, Wq={self.Wq})"
+
+
+class QueueModel:
+    """
+    An M/M/1 queue. The arrival and departure rates may be arrays, in which
+    case they are broadcast together and every measure is an array with one
+    entry per scenario. Measures of unstable scenarios (ρ ≥ 1) are NaN.
+    """
+    arrival_rate: np.ndarray
+    departure_rate: np.ndarray
+
+    def __init__(self, arrival_rate, departure_rate):
+        (self.arrival_rate, self.departure_rate) = np.broadcast_arrays(
+            np.asarray(arrival_rate, dtype=np.float64),
+            np.asarray(departure_rate, dtype=np.float64),
+        )
+
+    def rho(self) -> np.ndarray:
+        """ρ = λ / μ"""
+        return rho(self.arrival_rate, self.departure_rate)
+
+    def is_stable(self) -> np.ndarray:
+        """ρ < 1"""
+        return self.rho() < 1
+
+    def _mask_unstable(self, values) -> np.ndarray:
+        return np.where(self.is_stable(), values, np.nan)
+
+    def L(self) -> np.ndarray:
+        """L = ρ / (1 - ρ)"""
+        rho = self.rho()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._mask_unstable(rho / (1 - rho))
+
+    def Lq(self) -> np.ndarray:
+        """Lq = ρ² / (1 - ρ)"""
+        rho = self.rho()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._mask_unstable(rho**2 / (1 - rho))
+
+    def W(self) -> np.ndarray:
+        """W = 1 / (μ - λ)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._mask_unstable(1 / (self.departure_rate - self.arrival_rate))
+
+    def Wq(self) -> np.ndarray:
+        """Wq = ρ / (μ - λ)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._mask_unstable(self.rho() / (self.departure_rate - self.arrival_rate))
+
+    def probability_of_n_on_queue(self, n) -> np.ndarray:
+        """p(n) = ρ^n (1 - ρ)"""
+        return self._mask_unstable(prob_of_n_on_queue(n, self.rho()))
+
+    def probability_of_at_most_n_on_queue(self, n) -> np.ndarray:
+        """p(0..n) = 1 - ρ^(n+1)"""
+        return self._mask_unstable(prob_of_at_most_n_on_queue(n, self.rho()))
+
+    def probability_of_more_than_n_on_queue(self, n) -> np.ndarray:
+        """p(n+1..) = ρ^(n+1)"""
+        return self._mask_unstable(prob_of_more_than_n_on_queue(n, self.rho()))
+
+    def state_distribution(self, max_n: int) -> np.ndarray:
+        """p(0), ..., p(max_n) for every scenario, along a new last axis."""
+        n = np.arange(max_n + 1)
+        return np.where(
+            self.is_stable()[..., None],
+            prob_of_n_on_queue(n, self.rho()[..., None]),
+            np.nan,
+        )
+
+    def metrics(self) -> QueueMetrics:
+        return QueueMetrics(
+            rho=self.rho(),
+            L=self.L(),
+            Lq=self.Lq(),
+            W=self.W(),
+            Wq=self.Wq(),
+        )
@@ -0,0 +1,269 @@
+"""
+Constant-memory summaries of simulation output.
+
+- `RunningStats`: count, mean, variance, minimum and maximum (Welford's
+  update for single values, Chan et al.'s pairwise merge for chunks).
+- `TimeWeightedAverage`: the time average of a piecewise-constant level,
+  such as the number of customers in the system.
+- `P2Quantile`: Jain and Chlamtac's P² estimate of one quantile from five
+  markers.
+- `QuantileSketch`: every quantile to within a relative error, from counts
+  in logarithmically spaced buckets, updated a whole NumPy chunk at a time.
+
+None of them keep the observations, so a billion-customer run needs no more
+memory than a thousand-customer one.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class RunningStats:
+    count: int
+    mean: float
+    # Sum of squared deviations from the mean
+    m2: float
+    minimum: float
+    maximum: float
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def add_batch(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        mean = values.mean()
+        self._combine(values.size, float(mean), float(((values - mean)**2).sum()), float(values.min()), float(values.max()))
+
+    def merge(self, other: "RunningStats"):
+        self._combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+
+    def variance(self) -> float:
+        """Sample variance, s² = m2 / (n - 1)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    def std(self) -> float:
+        return math.sqrt(self.variance())
+
+    def __repr__(self) -> str:
+        return f"RunningStats(count={self.count}, mean={self.mean}, std={self.std()}, min={self.minimum}, max={self.maximum})"
+
+
+class TimeWeightedAverage:
+    start: Optional[float]
+    last_time: Optional[float]
+    level: float
+    # ∫ level dt from start to last_time
+    area: float
+
+    def __init__(self):
+        self.start = None
+        self.last_time = None
+        self.level = 0.0
+        self.area = 0.0
+
+    def update(self, time: float, level: float):
+        """The level changes to `level` at `time`."""
+        if self.last_time is None:
+            self.start = time
+        else:
+            self.area += self.level * (time - self.last_time)
+        self.last_time = time
+        self.level = level
+
+    def add_batch(self, times: np.ndarray, levels: np.ndarray):
+        """Equivalent to calling `update` for every (time, level) pair, in order."""
+        times = np.asarray(times, dtype=np.float64)
+        levels = np.asarray(levels, dtype=np.float64)
+        if times.size == 0:
+            return
+        if self.last_time is None:
+            self.start = float(times[0])
+        else:
+            self.area += self.level * (float(times[0]) - self.last_time)
+        self.area += float(np.dot(levels[:-1], np.diff(times)))
+        self.last_time = float(times[-1])
+        self.level = float(levels[-1])
+
+    def mean(self, until: Optional[float] = None) -> float:
+        """The average level from the first update to `until` (by default, the last update)."""
+        if self.last_time is None:
+            return math.nan
+        until = self.last_time if until is None else until
+        area = self.area + self.level * (until - self.last_time)
+        return area / (until - self.start) if until > self.start else math.nan
+
+
+class P2Quantile:
+    quantile: float
+    count: int
+    # Marker heights, actual positions and desired positions
+    heights: list
+    positions: list
+    desired: list
+
+    def __init__(self, quantile: float):
+        if not 0 < quantile < 1:
+            raise ValueError("quantile must be between 0 and 1")
+        self.quantile = quantile
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value: float):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self.positions
+        desired = self.desired
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            offset = desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        (q, n) = (self.heights, self.positions)
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def add_batch(self, values: np.ndarray):
+        add = self.add
+        for value in np.asarray(values, dtype=np.float64).ravel().tolist():
+            add(value)
+
+    def value(self) -> float:
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            return float(np.quantile(self.heights, self.quantile))
+        return self.heights[2]
+
+
+class QuantileSketch:
+    """
+    Quantiles of non-negative values to within `relative_accuracy`. Bucket
+    i holds the values in (γ^(i-1), γ^i], where γ = (1 + α) / (1 - α), and
+    exact zeros (customers who did not wait) are counted on their own.
+    """
+    relative_accuracy: float
+    count: int
+    zero_count: int
+    # counts[i] is the number of values in bucket offset + i
+    counts: np.ndarray
+    offset: int
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.offset = 0
+
+    def _cover(self, lowest: int, highest: int):
+        if len(self.counts) == 0:
+            self.offset = lowest
+            self.counts = np.zeros(highest - lowest + 1, dtype=np.int64)
+            return
+        start = min(self.offset, lowest)
+        end = max(self.offset + len(self.counts) - 1, highest)
+        if start == self.offset and end == self.offset + len(self.counts) - 1:
+            return
+        counts = np.zeros(end - start + 1, dtype=np.int64)
+        counts[self.offset - start:self.offset - start + len(self.counts)] = self.counts
+        (self.counts, self.offset) = (counts, start)
+
+    def add_batch(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        if values.min() < 0:
+            raise ValueError("QuantileSketch only accepts non-negative values")
+
+        positive = values[values > 0]
+        self.count += values.size
+        self.zero_count += values.size - positive.size
+        if positive.size == 0:
+            return
+
+        buckets = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        self._cover(int(buckets.min()), int(buckets.max()))
+        self.counts += np.bincount(buckets - self.offset, minlength=len(self.counts))
+
+    def add(self, value: float):
+        self.add_batch(np.array([value]))
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("sketches with different accuracies can't be merged")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        if len(other.counts):
+            self._cover(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side="right"))
+        bucket = min(bucket, len(self.counts) - 1)
+        return 2 * self.gamma**(self.offset + bucket) / (self.gamma + 1)
@@ -0,0 +1,148 @@
+"""
+Time-dependent state probabilities P(N(t) = n) of M/M/c and M/M/c/K queues.
+
+The queue is a birth-death process with birth rates λ and death rates
+μ min(n, c). Uniformization turns its generator Q into the transition matrix
+P = I + Q / Λ of a chain that jumps at the times of a Poisson process with
+rate Λ ≥ every exit rate, so
+
+    p(t) = Σ_k e^(-Λt) (Λt)^k / k!  p(0) P^k
+
+The vectors p(0) P^k are computed once, by sparse matrix-vector products,
+and weighted for every requested time at the same time, a block of steps at
+a time. The Poisson weights are computed in log space so large Λt neither
+underflows nor overflows.
+
+An infinite queue is truncated where it can't reach before the last time:
+with n0 customers at the start and at most Poisson(λt) arrivals, states
+above the tolerance-quantile of n0 + Poisson(λt) are dropped.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.special import gammaln, xlogy
+from scipy.stats import poisson
+
+from .multiserver import MultiServerQueueModel
+
+
+def birth_death_generator(arrival_rate: float, departure_rate: float, servers: int, max_n: int) -> sparse.csr_array:
+    """The generator Q of the queue on the states 0..max_n, where arrivals to max_n are lost."""
+    n = np.arange(max_n + 1)
+    births = np.where(n < max_n, arrival_rate, 0.0)
+    deaths = departure_rate * np.minimum(n, servers)
+    return sparse.diags_array(
+        [births[:-1], -(births + deaths), deaths[1:]],
+        offsets=[1, 0, -1],
+        format="csr",
+    )
+
+
+class TransientSolution:
+    times: np.ndarray
+    # probabilities[i, n] = P(N(times[i]) = n)
+    probabilities: np.ndarray
+    servers: int
+
+    def __init__(self, times: np.ndarray, probabilities: np.ndarray, servers: int):
+        self.times = times
+        self.probabilities = probabilities
+        self.servers = servers
+
+    def L(self) -> np.ndarray:
+        """L(t) = Σ n p(n, t)"""
+        return self.probabilities @ np.arange(self.probabilities.shape[1])
+
+    def Lq(self) -> np.ndarray:
+        """Lq(t) = Σ (n - c) p(n, t) over n > c"""
+        return self.probabilities @ np.maximum(np.arange(self.probabilities.shape[1]) - self.servers, 0)
+
+    def probability_of_n_on_queue(self, n: int) -> np.ndarray:
+        if not 0 <= n < self.probabilities.shape[1]:
+            return np.zeros(len(self.times))
+        return self.probabilities[:, n]
+
+    def probability_of_more_than_n_on_queue(self, n: int) -> np.ndarray:
+        """p(n+1.., t)"""
+        return self.probabilities[:, max(n + 1, 0):].sum(axis=1)
+
+
+def transient_distribution(
+    arrival_rate: float,
+    departure_rate: float,
+    times,
+    servers: int = 1,
+    capacity: Optional[int] = None,
+    initial: int = 0,
+    max_n: Optional[int] = None,
+    tolerance: float = 1e-12,
+    block_size: int = 256,
+) -> TransientSolution:
+    """
+    P(N(t) = n) at every time in `times`, starting with `initial` customers.
+    `capacity` makes this an M/M/c/K queue; otherwise the state space is cut
+    off at `max_n`, by default chosen from `tolerance` as described above.
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if times.size and times.min() < 0:
+        raise ValueError("times must not be negative")
+    last_time = float(times.max(initial=0))
+
+    if capacity is not None:
+        max_n = capacity
+    elif max_n is None:
+        max_n = initial + int(poisson.isf(tolerance, arrival_rate * last_time)) + 1
+    if not 0 <= initial <= max_n:
+        raise ValueError("the initial state is outside the state space")
+
+    generator = birth_death_generator(arrival_rate, departure_rate, servers, max_n)
+    uniformization_rate = max(float(-generator.diagonal().min()), 1e-300)
+    transitions = (sparse.identity(max_n + 1, format="csr") + generator / uniformization_rate).T.tocsr()
+
+    # Steps beyond the tolerance-quantile of Poisson(Λ t) carry no weight at any time
+    poisson_means = uniformization_rate * times
+    steps = int(poisson.isf(tolerance, poisson_means.max(initial=0))) + 1
+
+    state = np.zeros(max_n + 1)
+    state[initial] = 1.0
+    probabilities = np.zeros((len(times), max_n + 1))
+    block = np.empty((block_size, max_n + 1))
+
+    for start in range(0, steps, block_size):
+        size = min(block_size, steps - start)
+        for i in range(size):
+            block[i] = state
+            state = transitions @ state
+
+        k = np.arange(start, start + size)
+        log_weights = -poisson_means[:, None] + xlogy(k[None, :], poisson_means[:, None]) - gammaln(k + 1)[None, :]
+        probabilities += np.exp(log_weights) @ block[:size]
+
+    return TransientSolution(times, probabilities, servers)
+
+
+def time_to_steady_state(arrival_rate: float, departure_rate: float, servers: int = 1, initial: int = 0, tolerance: float = 0.01, horizon: Optional[float] = None, points: int = 200) -> float:
+    """
+    The first of `points` evenly spaced times up to `horizon` at which the
+    total variation distance between p(t) and the steady-state distribution
+    of a stable M/M/c queue falls below `tolerance`, or NaN if it never does.
+    """
+    model = MultiServerQueueModel(arrival_rate, departure_rate, servers)
+    if not model.is_stable():
+        return math.nan
+    if horizon is None:
+        # A generous multiple of the relaxation time, which is about 1 / (√(cμ) - √λ)²
+        # when the servers are busy and 1 / μ when most of them are idle
+        horizon = 20 / min(departure_rate, (math.sqrt(servers * departure_rate) - math.sqrt(arrival_rate))**2)
+
+    times = np.linspace(0, horizon, points)
+    solution = transient_distribution(arrival_rate, departure_rate, times, servers, initial=initial)
+    steady_state = model.state_distribution(solution.probabilities.shape[1] - 1)
+    if not np.all(np.isfinite(steady_state)):
+        raise ValueError("the steady-state distribution isn't finite")
+    distances = 0.5 * np.abs(solution.probabilities - steady_state).sum(axis=1)
+
+    reached = np.flatnonzero(distances < tolerance)
+    return float(times[reached[0]]) if len(reached) else math.nan